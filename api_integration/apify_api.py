@@ -1,137 +1,449 @@
 import time
 import asyncio
-from typing import Tuple
+import argparse
+from typing import Tuple, AsyncIterator
+from collections import deque
 from datetime import datetime
 
 from apify_client import ApifyClientAsync
 
+from api_integration.apify_coalescer import SingleFlight
+from api_integration.records import PostRecord, FollowingRecord
+from api_integration.apify_resilience import ActorRunError, CircuitBreaker, retry_with_backoff
+from api_integration.apify_scheduler import FairScheduler
+
 
 class ApifyService:
     ACTOR_PROFILE_X_ID = "apidojo/twitter-user-scraper"
     ACTOR_POSTS_X_ID = "apidojo/twitter-scraper-lite"
+    DATASET_PAGE_SIZE = 100
+
+    MAX_CONCURRENT_RUNS = 100  # Apify account limit is 125 runs
+    RETRY_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 2.0
+    LATENCY_WINDOW = 200
+    LATENCY_MIN_SAMPLES = 20
 
-    def __init__(self, apify_key: str):
+    def __init__(
+            self,
+            apify_key: str,
+            posts_batch_size: int = 10,
+            dataset_page_size: int = DATASET_PAGE_SIZE,
+            max_concurrent_runs: int = MAX_CONCURRENT_RUNS,
+            retry_attempts: int = RETRY_ATTEMPTS,
+            breaker_failure_threshold: int = 5,
+            breaker_reset_timeout: float = 60.0,
+            hedge_percentile: float = 0.0,
+            apify_client=None
+        ):
         self.__apify_key = apify_key
-        self.apify_client = ApifyClientAsync(self.__apify_key)
+        # Client can be replaced with FakeApifyClientAsync for offline benchmarks, real client is created on first use
+        self._apify_client = apify_client
+        # One scheduler for all users of this process
+        self.scheduler = FairScheduler(max_concurrency=max_concurrent_runs)
+        # Identical runs requested at the same time are started once
+        self.coalescer = SingleFlight()
+        self.retry_attempts = max(1, retry_attempts)
+        # Posts run slower than this percentile of recent runs gets a second (hedged) run, 0 disables hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedged_runs = 0
+        self.run_durations = {
+            actor_id: deque(maxlen=self.LATENCY_WINDOW)
+            for actor_id in (self.ACTOR_PROFILE_X_ID, self.ACTOR_POSTS_X_ID)
+        }
+        self.breakers = {
+            actor_id: CircuitBreaker(actor_id, breaker_failure_threshold, breaker_reset_timeout)
+            for actor_id in (self.ACTOR_PROFILE_X_ID, self.ACTOR_POSTS_X_ID)
+        }
+        self.posts_batch_size = max(1, posts_batch_size)
+        self.dataset_page_size = max(1, dataset_page_size)
+
+    @property
+    def apify_client(self):
+        if self._apify_client is None:
+            self._apify_client = ApifyClientAsync(self.__apify_key)
+        return self._apify_client
+
+    @staticmethod
+    def _map_post(post: dict) -> PostRecord:
+        """
+        Convert raw actor item to post record
+        """
+        return PostRecord.from_actor_item(post)
+
+    @staticmethod
+    def _map_following(following: dict) -> FollowingRecord:
+        """
+        Convert raw actor item to following profile record
+        """
+        return FollowingRecord.from_actor_item(following)
+
+    def stats(self) -> dict:
+        return {
+            "scheduler": self.scheduler.stats(),
+            "coalescer": self.coalescer.stats(),
+            "breakers": {actor_id: breaker.stats() for actor_id, breaker in self.breakers.items()},
+            "hedged_runs": self.hedged_runs
+        }
+
+    def latency_percentile(self, actor_id: str, percentile: float) -> float | None:
+        """
+        Duration of actor runs at given percentile (0..1), None until enough runs are recorded
+        """
+        durations = sorted(self.run_durations[actor_id])
+        if len(durations) < self.LATENCY_MIN_SAMPLES:
+            return None
+        return durations[min(len(durations) - 1, int(len(durations) * percentile))]
+
+    def split_into_batches(self, x_profile_names: list[str], batch_size: int = None) -> list[list[str]]:
+        """
+        Split profile names into batches for one actor run each
+        """
+        size = max(1, batch_size or self.posts_batch_size)
+        return [x_profile_names[i:i + size] for i in range(0, len(x_profile_names), size)]
+
+    async def _call_actor(self, actor_id: str, run_input: dict, user_id: int = None, hedge: bool = False) -> str:
+        """
+        Start an Actor, wait for it to finish and return id of its default dataset.
+        Concurrent calls with the same input share one run.
+        Failed runs are retried with backoff, raises ActorRunError when all attempts failed.
+        """
+        key = self.coalescer.make_key(actor_id, run_input)
+        if not hedge or self.hedge_percentile <= 0:
+            return await self.coalescer.do(key, lambda: self._run_actor_with_retry(actor_id, run_input, user_id))
+        # Set when primary run gets a scheduler slot, time in queue is not a slow run
+        started = asyncio.Event()
+        primary = self.coalescer.do(key, lambda: self._run_actor_with_retry(actor_id, run_input, user_id, started))
+        return await self._hedged(
+            actor_id, primary, started, lambda: self._run_actor_with_retry(actor_id, run_input, user_id)
+        )
+
+    async def _run_actor_with_retry(
+            self,
+            actor_id: str,
+            run_input: dict,
+            user_id: int = None,
+            started: asyncio.Event = None
+        ) -> str:
+        return await retry_with_backoff(
+            lambda: self._run_actor(actor_id, run_input, user_id, started),
+            attempts=self.retry_attempts,
+            base_delay=self.RETRY_BASE_DELAY,
+            description=f"actor [{actor_id}] run"
+        )
+
+    async def _hedged(self, actor_id: str, primary, started: asyncio.Event, start_hedge) -> str:
+        """
+        Wait for primary run, if it runs (in its scheduler slot) longer than `hedge_percentile` of recent runs
+        start a second run. No hedge is started while other runs wait for slots, it would only queue behind them.
+        First successful run wins, the other one is cancelled (and aborted on Apify).
+        """
+        threshold = self.latency_percentile(actor_id, self.hedge_percentile)
+        tasks = [asyncio.ensure_future(primary)]
+        started_task = asyncio.ensure_future(started.wait())
+        try:
+            if threshold is None:
+                return await tasks[0]
+
+            # Run joined by coalescer was started by another caller, its start is not known: wait for the result
+            await asyncio.wait([tasks[0], started_task], return_when=asyncio.FIRST_COMPLETED)
+            if not tasks[0].done():
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+                if not done and self.scheduler.queue_depth == 0:
+                    print(f"Actor [{actor_id}] run is slower than {threshold:.1f}s, starting hedged run")
+                    self.hedged_runs += 1
+                    tasks.append(asyncio.ensure_future(start_hedge()))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # All runs failed, raise error of primary run
+            return tasks[0].result()
+
+        finally:
+            started_task.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _run_actor(
+            self,
+            actor_id: str,
+            run_input: dict,
+            user_id: int = None,
+            started: asyncio.Event = None
+        ) -> str:
+        """
+        Run waits for a free slot in scheduler, slots are shared fairly between users.
+        `started` is set when slot is acquired. Result of run is recorded in circuit breaker of actor.
+        """
+        breaker = self.breakers[actor_id]
+        breaker.before_call()
+        actor_client = self.apify_client.actor(actor_id)
+        try:
+            async with self.scheduler.slot(user_id):
+                if started is not None:
+                    started.set()
+                start_time = time.perf_counter()
+                run = await actor_client.start(run_input=run_input)
+                run_client = self.apify_client.run(run['id'])
+                try:
+                    call_result = await run_client.wait_for_finish()
+                except asyncio.CancelledError:
+                    # Nobody waits for this run anymore, don't pay for it
+                    await self._abort_run(run_client, actor_id)
+                    raise
+                self.run_durations[actor_id].append(time.perf_counter() - start_time)
+
+            if call_result is None:
+                raise ActorRunError(f'Actor [{actor_id}] run failed.')
+            if call_result.get('status', 'SUCCEEDED') != 'SUCCEEDED':
+                raise ActorRunError(f'Actor [{actor_id}] run finished with status {call_result["status"]}.')
+
+        except asyncio.CancelledError:
+            breaker.record_cancel()
+            raise
+        except Exception as ex:
+            breaker.record_failure()
+            if isinstance(ex, ActorRunError):
+                raise
+            raise ActorRunError(f'Actor [{actor_id}] run failed: {ex}') from ex
+
+        breaker.record_success()
+        return call_result['defaultDatasetId']
+
+    @staticmethod
+    async def _abort_run(run_client, actor_id: str):
+        try:
+            await run_client.abort()
+            print(f"Actor [{actor_id}] run aborted")
+        except Exception as ex:
+            print(f"Failed to abort actor [{actor_id}] run: {ex}")
+
+    async def _list_dataset_page(self, dataset_client, offset: int):
+        async def list_page():
+            return await dataset_client.list_items(offset=offset, limit=self.dataset_page_size)
+
+        try:
+            return await retry_with_backoff(
+                list_page,
+                attempts=self.retry_attempts,
+                base_delay=self.RETRY_BASE_DELAY,
+                description="dataset page fetch"
+            )
+        except Exception as ex:
+            raise ActorRunError(f"Failed to fetch dataset page: {ex}") from ex
+
+    async def _iter_dataset_items(self, dataset_id: str) -> AsyncIterator[dict]:
+        """
+        Page through the dataset and yield raw items, `dataset_page_size` items per request
+        """
+        dataset_client = self.apify_client.dataset(dataset_id)
+        offset = 0
+        while True:
+            page = await self._list_dataset_page(dataset_client, offset)
+            for item in page.items:
+                if item.get("noResults") is True:
+                    print(f"No results in dataset {dataset_id}: {item}")
+                    continue
+                yield item
+
+            offset += page.count
+            if page.count < self.dataset_page_size or offset >= page.total:
+                break
+
+    async def iter_x_posts(
+            self,
+            x_profile_names: list[str],
+            max_items: int = 20,
+            start_date: datetime = None,
+            end_date: datetime = None,
+            since: dict[str, datetime] = None,
+            user_id: int = None
+        ) -> AsyncIterator[PostRecord]:
+        """
+        Run posts actor for X profiles and yield posts page by page, as they are fetched.
+        Actor has only a total item limit, it is `max_items` per profile times number of profiles,
+        so busy profiles can take items of others (see run_get_x_posts_batch).
+        `since` maps profile name to timestamp of the newest known post, only newer posts are requested.
+        """
+        start_str = start_date.strftime('%Y-%m-%d') if start_date else datetime.now().strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d') if end_date else datetime.now().strftime('%Y-%m-%d')
+        since = since or {}
+
+        run_input = {
+            "end": end_str,
+            "maxItems": max_items * len(x_profile_names),
+            "sort": "Latest",
+            "start": start_str,
+            "startUrls": [
+                f"https://x.com/{x_profile_name}" for x_profile_name in x_profile_names
+                if x_profile_name not in since
+            ]
+        }
+        if since:
+            # Search by author with exact time bound, to get only posts after high-water mark
+            run_input["searchTerms"] = [
+                f"from:{x_profile_name} since_time:{int(since[x_profile_name].timestamp())}"
+                for x_profile_name in x_profile_names
+                if x_profile_name in since
+            ]
+
+        dataset_id = await self._call_actor(self.ACTOR_POSTS_X_ID, run_input, user_id, hedge=True)
+        async for post in self._iter_dataset_items(dataset_id):
+            yield self._map_post(post)
+
+    async def iter_x_followings(
+            self,
+            x_profile_name: str,
+            max_items: int = 20,
+            user_id: int = None
+        ) -> AsyncIterator[FollowingRecord]:
+        """
+        Run followings actor for X profile and yield followings page by page, as they are fetched
+        """
+        run_input = {
+            "customMapFunction": "(object) => { return {...object} }",
+            "getFollowers": False,
+            "getFollowing": True,
+            "getRetweeters": False,
+            "includeUnavailableUsers": False,
+            "maxItems": max_items,
+            "twitterHandles": [
+                x_profile_name,
+            ]
+        }
+
+        dataset_id = await self._call_actor(self.ACTOR_PROFILE_X_ID, run_input, user_id)
+        async for following in self._iter_dataset_items(dataset_id):
+            yield self._map_following(following)
 
     async def run_get_x_posts(
             self,
             x_profile_name: str,
             max_items: int = 20,
             start_date: datetime = None,
-            end_date: datetime = None
-        ) -> list[dict]:
+            end_date: datetime = None,
+            user_id: int = None
+        ) -> list[PostRecord]:
         """
         Get information about posts for selected X profile
         """
-        try:
-            start_str = start_date.strftime('%Y-%m-%d') if start_date else datetime.now().strftime('%Y-%m-%d')
-            end_str = end_date.strftime('%Y-%m-%d') if end_date else datetime.now().strftime('%Y-%m-%d')
-
-            run_input = {
-                "end": end_str,
-                "maxItems": max_items,
-                "sort": "Latest",
-                "start": start_str,
-                "startUrls": [
-                    f"https://x.com/{x_profile_name}"
-                ]
-            }
-
-            # Start an Actor and wait for it to finish.
-            actor_client = self.apify_client.actor(self.ACTOR_POSTS_X_ID)
-            call_result = await actor_client.call(run_input=run_input)
+        results = await self.run_get_x_posts_batch(
+            x_profile_names=[x_profile_name],
+            max_items=max_items,
+            start_date=start_date,
+            end_date=end_date,
+            user_id=user_id
+        )
+        return results.get(x_profile_name, [])
 
-            if call_result is None:
-                print(f'Actor [{self.ACTOR_POSTS_X_ID}] run failed.')
-                return []
-
-            # Fetch results from the Actor run's default dataset.
-            dataset_client = self.apify_client.dataset(call_result['defaultDatasetId'])
-            list_items_result = await dataset_client.list_items()
-            # print(f"Type DATASET: {type(list_items_result)}")
-            # print(f'Dataset: {list_items_result}')
-            posts = list_items_result.items
-            if len(posts) == 1:
-                if posts[0].get("noResults") is True:
-                    print(f"No posts found for {x_profile_name}: {posts[0]}")
-                    return []
-            
-            results = []
-            for post in posts:
-                print(f"🔹 Post:\n{post}")
-                # TODO add likeCount, replyCount, retweetCount, viewCount, author, followers_count to DB
-                results.append({
-                    "author": post["author"].get("userName", "Not found"),
-                    "followers_count": post["author"].get("followers", "Not found"),
-                    "content": post["text"],
-                    "url": post["url"],
-                    "likeCount": post.get("likeCount", "Not found"),
-                    "replyCount": post.get("replyCount", "Not found"),
-                    "retweetCount": post.get("retweetCount", "Not found"),
-                    "viewCount": post.get("viewCount", "Not found"),
-                    "timestamp": datetime.strptime(post["createdAt"], '%a %b %d %H:%M:%S %z %Y')
-                })
+    async def _get_x_posts_batch(
+            self,
+            x_profile_names: list[str],
+            max_items: int,
+            start_date: datetime = None,
+            end_date: datetime = None,
+            since: dict[str, datetime] = None,
+            user_id: int = None
+        ) -> tuple[dict[str, list[PostRecord]], bool]:
+        """
+        One actor run for profiles, returns posts by profile and whether the run hit its item limit
+        (then posts of profiles which got less than `max_items` may be cut off)
+        """
+        # Keys are matched case-insensitive, but results use names from request
+        results = {name: [] for name in x_profile_names}
+        names_map = {name.lower(): name for name in x_profile_names}
+        since = since or {}
+        items = 0
+        async for post in self.iter_x_posts(x_profile_names, max_items, start_date, end_date, since, user_id):
+            items += 1
+            name = names_map.get(post.author.lower())
+            if name is None:
+                # Retweets and replies of other authors are not part of profile feed
+                continue
 
-            return results
-        
-        except Exception as ex:
-            print(f"Critical mistake during work with 'run_get_x_posts': {ex}")
-            return []
+            if name in since and post.timestamp <= since[name]:
+                continue
 
+            if len(results[name]) < max_items:
+                results[name].append(post)
+        return results, items >= max_items * len(x_profile_names)
 
-    async def run_get_x_followings_actor(self, x_profile_name: str, max_items: int = 20) -> list[dict]:
+    async def run_get_x_posts_batch(
+            self,
+            x_profile_names: list[str],
+            max_items: int = 20,
+            start_date: datetime = None,
+            end_date: datetime = None,
+            since: dict[str, datetime] = None,
+            user_id: int = None
+        ) -> dict[str, list[PostRecord]]:
         """
-        Get information about followings for selected X profile
+        Get information about posts for several X profiles with one actor run.
+        Posts are split back by author, `max_items` is a limit per profile.
+        Item limit of the actor is a total for the run, so when it is hit, profiles which got less than `max_items`
+        posts are scraped again one by one. Profiles which still got no posts from a run which hit the limit
+        are left out of results (not scraped, rather than empty).
+        Posts not newer than `since` mark of profile are dropped.
+        Raises ActorRunError if posts can't be fetched.
         """
-        
-        try:
-            run_input = {
-                "customMapFunction": "(object) => { return {...object} }",
-                "getFollowers": False,
-                "getFollowing": True,
-                "getRetweeters": False,
-                "includeUnavailableUsers": False,
-                "maxItems": max_items,
-                "twitterHandles": [
-                    x_profile_name,
-                ]
-            }
-
-            # Start an Actor and wait for it to finish.
-            actor_client = self.apify_client.actor(self.ACTOR_PROFILE_X_ID)
-            call_result = await actor_client.call(run_input=run_input)
+        if not x_profile_names:
+            return {}
 
-            if call_result is None:
-                print(f'Actor [{self.ACTOR_PROFILE_X_ID}] run failed.')
-                return []
-            
-            # Fetch results from the Actor run's default dataset.
-            dataset_client = self.apify_client.dataset(call_result['defaultDatasetId'])
-            list_items_result = await dataset_client.list_items()
-            # print(f"Type DATASET: {type(list_items_result)}")
-            # print(f'Dataset: {list_items_result}')
-            followings = list_items_result.items
-            if followings[0].get("noResults") is True:
-                print(f"No followingss found for {x_profile_name}: {followings[0]}")
-                return []
-
-            results = []
-            for following in followings:
-                # print(f"🔹 Following:\n{following}")
-                # TODO add followers to DB
-                results.append({
-                    "username": following["userName"],
-                    "full_name": following["name"],
-                    "twitter_id": following["id"],
-                    "followers_count": following["followers"]
-                })
+        try:
+            since = since or {}
+            results, capped = await self._get_x_posts_batch(
+                x_profile_names, max_items, start_date, end_date, since, user_id
+            )
+            capped_names = [name for name in x_profile_names if len(results[name]) < max_items] if capped else []
+            if len(x_profile_names) > 1 and capped_names:
+                print(f"Posts run hit item limit, scraping {len(capped_names)} profiles one by one")
+                single_results = await asyncio.gather(*[
+                    self._get_x_posts_batch(
+                        [name], max_items, start_date, end_date,
+                        {name: since[name]} if name in since else {}, user_id
+                    )
+                    for name in capped_names
+                ])
+                capped_names = []
+                for single, single_capped in single_results:
+                    results.update(single)
+                    if single_capped:
+                        capped_names.extend(single)
 
+            for name in capped_names:
+                if not results[name]:
+                    del results[name]
             return results
-        
+
+        except Exception as ex:
+            print(f"Critical mistake during work with 'run_get_x_posts_batch': {ex}")
+            if isinstance(ex, ActorRunError):
+                raise
+            raise ActorRunError(f"Failed to get posts: {ex}") from ex
+
+    async def run_get_x_followings_actor(
+            self,
+            x_profile_name: str,
+            max_items: int = 20,
+            user_id: int = None
+        ) -> list[FollowingRecord]:
+        """
+        Get information about followings for selected X profile.
+        Raises ActorRunError if followings can't be fetched.
+        """
+        try:
+            return [following async for following in self.iter_x_followings(x_profile_name, max_items, user_id)]
+
         except Exception as ex:
             print(f"Critical mistake during work with 'run_get_x_followings_actor': {ex}")
-            return []
+            if isinstance(ex, ActorRunError):
+                raise
+            raise ActorRunError(f"Failed to get followings: {ex}") from ex
 
 
 # For tests
@@ -154,27 +466,71 @@ async def run_followings_task(profile_name: str, service: ApifyService) -> Tuple
     return result, duration
 
 
-async def main():
-    api_key = ""
-    overall_start = time.perf_counter()
-    service = ApifyService(apify_key=api_key)
+async def run_user_task(user_id: int, profile_name: str, service: ApifyService, max_followings: int) -> float:
+    """
+    Same flow as summary request: followings of profile, then posts of all followings in batches
+    """
+    start = time.perf_counter()
+    followings = await service.run_get_x_followings_actor(x_profile_name=profile_name, max_items=max_followings,
+                                                          user_id=user_id)
+    batches = service.split_into_batches([following.username for following in followings])
+    results = await asyncio.gather(
+        *[service.run_get_x_posts_batch(x_profile_names=batch, max_items=10, user_id=user_id) for batch in batches],
+        return_exceptions=True
+    )
+    posts_count = sum(len(posts) for result in results if isinstance(result, dict) for posts in result.values())
+    duration = time.perf_counter() - start
+    print(f"[user {user_id}] {len(followings)} followings, {posts_count} posts in {duration:.2f} seconds")
+    return duration
+
 
-    profiles = ["elonmusk"]
-    # # For check Posts
-    # tasks = [run_profile_task(profile, service) for profile in profiles]
+async def main():
+    """
+    Benchmark of ApifyService. Without API key it runs against FakeApifyClientAsync with recorded datasets.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of ApifyService")
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--followings", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--max-runs", type=int, default=ApifyService.MAX_CONCURRENT_RUNS)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
 
-    # For check Followings
-    tasks = [run_followings_task(profile, service) for profile in profiles]
+    apify_client = None
+    if not args.api_key:
+        from api_integration.apify_fake import FakeApifyClientAsync
+        apify_client = FakeApifyClientAsync(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            failure_rate=args.failure_rate,
+            seed=args.seed
+        )
 
-    results = await asyncio.gather(*tasks)
+    service = ApifyService(
+        apify_key=args.api_key,
+        posts_batch_size=args.batch_size,
+        max_concurrent_runs=args.max_runs,
+        apify_client=apify_client
+    )
+    service.RETRY_BASE_DELAY = 0.1
 
+    overall_start = time.perf_counter()
+    # Users ask for the same profile, so coalescing of runs is visible too
+    durations = await asyncio.gather(
+        *[run_user_task(user_id, "elonmusk", service, args.followings) for user_id in range(args.users)]
+    )
     overall_duration = time.perf_counter() - overall_start
 
     print("\n=== Results ===")
-    for profile, (result, duration) in zip(profiles, results):
-        print(f"{profile}: duration = {duration:.2f}s, result = {result}")
-
-    print(f"\nTotal time for all tasks: {overall_duration:.2f} seconds")
+    print(f"Request duration: avg = {sum(durations) / len(durations):.2f}s, max = {max(durations):.2f}s")
+    print(f"Total time for all tasks: {overall_duration:.2f} seconds")
+    if apify_client is not None:
+        print(f"Actor runs started: {apify_client.started_runs}, aborted: {apify_client.aborted_runs}")
+    print(f"Stats: {service.stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,71 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls: concurrent callers with the same key await one shared task.
+    Shared task is cancelled when all its callers are cancelled.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(value):
+        if isinstance(value, dict):
+            return {k: SingleFlight._normalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            # Order of handles/urls in actor input doesn't change its result, X handles are case-insensitive
+            return sorted(
+                (SingleFlight._normalize(v) for v in value),
+                key=lambda v: json.dumps(v, sort_keys=True, default=str)
+            )
+        if isinstance(value, str):
+            return value.lower()
+        return value
+
+    @classmethod
+    def make_key(cls, actor_id: str, run_input: dict) -> tuple[str, str]:
+        return actor_id, json.dumps(cls._normalize(run_input), sort_keys=True, default=str)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.hits += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield shared task, so cancellation of one caller doesn't cancel it for others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(task) == 1:
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "in_flight": len(self._in_flight)
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import copy
+import itertools
+import json
+import os
+import random
+import re
+from datetime import datetime, timedelta, timezone
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+
+
+class FakeListPage:
+    """Same fields as ListPage of apify_client"""
+
+    def __init__(self, items: list[dict], offset: int, limit: int, total: int):
+        self.items = items
+        self.offset = offset
+        self.limit = limit
+        self.count = len(items)
+        self.total = total
+        self.desc = False
+
+
+class FakeDatasetClient:
+    def __init__(self, items: list[dict]):
+        self._items = items
+
+    async def list_items(self, offset: int = None, limit: int = None, **kwargs) -> FakeListPage:
+        offset = offset or 0
+        end = len(self._items) if limit is None else offset + limit
+        return FakeListPage(self._items[offset:end], offset, limit or 0, len(self._items))
+
+
+class FakeRunClient:
+    def __init__(self, client: "FakeApifyClientAsync", run_id: str):
+        self._client = client
+        self._run_id = run_id
+
+    async def wait_for_finish(self, wait_secs: int = None) -> dict | None:
+        run = self._client.runs[self._run_id]
+        await asyncio.sleep(run["latency"])
+        if run["status"] == "RUNNING":
+            run["status"] = "FAILED" if run["fail"] else "SUCCEEDED"
+        return {"id": self._run_id, "status": run["status"], "defaultDatasetId": run["defaultDatasetId"]}
+
+    async def abort(self, gracefully: bool = None) -> dict:
+        run = self._client.runs[self._run_id]
+        run["status"] = "ABORTED"
+        self._client.aborted_runs += 1
+        return {"id": self._run_id, "status": run["status"]}
+
+
+class FakeActorClient:
+    def __init__(self, client: "FakeApifyClientAsync", actor_id: str):
+        self._client = client
+        self._actor_id = actor_id
+
+    async def start(self, run_input: dict = None, **kwargs) -> dict:
+        return self._client.start_run(self._actor_id, run_input or {})
+
+    async def call(self, run_input: dict = None, **kwargs) -> dict | None:
+        run = await self.start(run_input=run_input)
+        return await self._client.run(run["id"]).wait_for_finish()
+
+
+class FakeApifyClientAsync:
+    """
+    Stand-in for ApifyClientAsync which replays recorded datasets, for benchmarks without network.
+    Posts are generated for every requested handle from recorded posts, followings are taken from recorded ones.
+    Every run takes `latency` (+- `latency_jitter`) seconds and fails with probability `failure_rate`.
+    """
+    POSTS_RECORDING = "twitter-scraper-lite.json"
+    FOLLOWINGS_RECORDING = "twitter-user-scraper.json"
+
+    def __init__(
+            self,
+            recordings_dir: str = RECORDINGS_DIR,
+            latency: float = 1.0,
+            latency_jitter: float = 0.0,
+            failure_rate: float = 0.0,
+            items_per_profile: int = 10,
+            seed: int = 0
+        ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.items_per_profile = items_per_profile
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._recorded_posts = self._load(recordings_dir, self.POSTS_RECORDING)
+        self._recorded_followings = self._load(recordings_dir, self.FOLLOWINGS_RECORDING)
+        self.runs: dict[str, dict] = {}
+        self.datasets: dict[str, list[dict]] = {}
+        self.started_runs = 0
+        self.aborted_runs = 0
+
+    @staticmethod
+    def _load(recordings_dir: str, filename: str) -> list[dict]:
+        with open(os.path.join(recordings_dir, filename), encoding="utf-8") as f:
+            return json.load(f)
+
+    def actor(self, actor_id: str) -> FakeActorClient:
+        return FakeActorClient(self, actor_id)
+
+    def run(self, run_id: str) -> FakeRunClient:
+        return FakeRunClient(self, run_id)
+
+    def dataset(self, dataset_id: str) -> FakeDatasetClient:
+        return FakeDatasetClient(self.datasets.get(dataset_id, []))
+
+    def start_run(self, actor_id: str, run_input: dict) -> dict:
+        self.started_runs += 1
+        run_id = f"run-{next(self._ids)}"
+        dataset_id = f"dataset-{run_id}"
+        if "twitterHandles" in run_input:
+            self.datasets[dataset_id] = self._make_followings(run_input)
+        else:
+            self.datasets[dataset_id] = self._make_posts(run_input)
+
+        jitter = self._random.uniform(-self.latency_jitter, self.latency_jitter)
+        self.runs[run_id] = {
+            "actorId": actor_id,
+            "status": "RUNNING",
+            "defaultDatasetId": dataset_id,
+            "latency": max(0.0, self.latency + jitter),
+            "fail": self._random.random() < self.failure_rate
+        }
+        return {"id": run_id, "status": "RUNNING", "defaultDatasetId": dataset_id}
+
+    def _make_posts(self, run_input: dict) -> list[dict]:
+        since = {}
+        for url in run_input.get("startUrls", []):
+            since[url.rstrip("/").rsplit("/", 1)[-1]] = None
+        for term in run_input.get("searchTerms", []):
+            match = re.match(r"from:(\S+)(?: since_time:(\d+))?", term)
+            if match:
+                since_time = match.group(2)
+                since[match.group(1)] = datetime.fromtimestamp(int(since_time), tz=timezone.utc) if since_time else None
+
+        now = datetime.now(timezone.utc)
+        per_profile = min(self.items_per_profile, run_input.get("maxItems", self.items_per_profile))
+        items = []
+        for handle, since_time in since.items():
+            for i in range(per_profile):
+                created_at = now - timedelta(minutes=10 * i + 1)
+                if since_time is not None and created_at <= since_time:
+                    break
+                post = copy.deepcopy(self._recorded_posts[i % len(self._recorded_posts)])
+                post["id"] = f"{handle}-{int(created_at.timestamp())}-{i}"
+                post["url"] = f"https://x.com/{handle}/status/{post['id']}"
+                post["createdAt"] = created_at.strftime('%a %b %d %H:%M:%S %z %Y')
+                post["author"]["userName"] = handle
+                items.append(post)
+
+        if not items:
+            return [{"noResults": True}]
+        return items[:run_input.get("maxItems", len(items))]
+
+    def _make_followings(self, run_input: dict) -> list[dict]:
+        max_items = run_input.get("maxItems", len(self._recorded_followings))
+        items = []
+        for i in range(max_items):
+            following = copy.deepcopy(self._recorded_followings[i % len(self._recorded_followings)])
+            if i >= len(self._recorded_followings):
+                following["userName"] = f"{following['userName']}_{i}"
+                following["id"] = f"{following['id']}{i}"
+            items.append(following)
+        return items or [{"noResults": True}]
+
+
+async def save_recording(apify_client, dataset_id: str, filename: str, recordings_dir: str = RECORDINGS_DIR):
+    """
+    Save items of a live dataset as recording for FakeApifyClientAsync
+    """
+    list_items_result = await apify_client.dataset(dataset_id).list_items()
+    with open(os.path.join(recordings_dir, filename), "w", encoding="utf-8") as f:
+        json.dump(list_items_result.items, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,91 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable
+
+
+class ActorRunError(Exception):
+    """Actor run or dataset fetch failed, it is not the same as empty result"""
+
+
+class CircuitOpenError(ActorRunError):
+    """Actor is considered broken, calls are rejected without starting a run"""
+
+
+class CircuitBreaker:
+    """
+    Per-actor circuit breaker.
+    After `failure_threshold` failures in a row circuit opens and calls are rejected for `reset_timeout` seconds,
+    then one probe call is allowed (half-open): its success closes circuit, failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit for actor [{self.name}] is open")
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(f"Circuit for actor [{self.name}] is half-open, probe is running")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            print(f"Circuit for actor [{self.name}] is closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"Circuit for actor [{self.name}] is open after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_cancel(self):
+        """Call was cancelled by caller, it says nothing about actor health"""
+        self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+async def retry_with_backoff(
+        func: Callable[[], Awaitable],
+        attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 30.0,
+        description: str = ""
+    ):
+    """
+    Call `func` until success, with exponential backoff and full jitter between attempts.
+    Open circuit is not retried.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func()
+        except CircuitOpenError:
+            raise
+        except Exception as ex:
+            if attempt == attempts:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            print(f"Attempt {attempt}/{attempts} of {description} failed: {ex}, retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+from utils.stats import mean, percentile
+
+
+class FairScheduler:
+    """
+    Process-wide limit for concurrent actor runs.
+    Waiters are queued per user and served round-robin, so one user with many runs can't starve others.
+    """
+
+    def __init__(self, max_concurrency: int, stats_window: int = 1000):
+        self.max_concurrency = max(1, max_concurrency)
+        self._running = 0
+        # user key -> queue of (future, enqueued_at), key order is the round-robin order
+        self._queues: OrderedDict[Hashable, deque] = OrderedDict()
+        self._waits = deque(maxlen=stats_window)
+        self._acquired_total = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _grant(self, waited: float):
+        self._running += 1
+        self._acquired_total += 1
+        self._waits.append(waited)
+
+    def _dispatch(self):
+        """
+        Give free slots to waiters, taking one waiter from each user in turn
+        """
+        while self._running < self.max_concurrency and self._queues:
+            key, queue = self._queues.popitem(last=False)
+            future, enqueued_at = queue.popleft()
+            if queue:
+                # User goes to the end of round-robin order
+                self._queues[key] = queue
+
+            if future.done():
+                continue
+            self._grant(time.perf_counter() - enqueued_at)
+            future.set_result(None)
+
+    def _remove_waiter(self, key: Hashable, future: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        for item in queue:
+            if item[0] is future:
+                queue.remove(item)
+                break
+        if not queue:
+            del self._queues[key]
+
+    async def acquire(self, key: Hashable = None):
+        if self._running < self.max_concurrency and not self._queues:
+            self._grant(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((future, time.perf_counter()))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was given right before cancellation
+                self.release()
+            else:
+                self._remove_waiter(key, future)
+            raise
+
+    def release(self):
+        self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable = None):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queue_depth": self.queue_depth,
+            "queued_users": len(self._queues),
+            "acquired_total": self._acquired_total,
+            "wait_avg": mean(waits),
+            "wait_p95": percentile(waits),
+            "wait_max": waits[-1] if waits else 0.0
+        }
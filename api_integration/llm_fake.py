@@ -0,0 +1,24 @@
+import asyncio
+import random
+
+
+class FakeLLM:
+    """
+    Stand-in for ChatGPT.complete for tests and benchmarks without network.
+    Answers with the first words of every prompt line after `latency` (+- `latency_jitter`) seconds.
+    """
+
+    def __init__(self, latency: float = 0.5, latency_jitter: float = 0.0, words_per_line: int = 8, seed: int = 0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.words_per_line = words_per_line
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.prompt_chars = 0
+
+    async def complete(self, system: str, prompt: str, model: str = None) -> str:
+        self.calls += 1
+        self.prompt_chars += len(system) + len(prompt)
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.latency_jitter, self.latency_jitter)))
+        lines = [line.split()[:self.words_per_line] for line in prompt.splitlines() if line.strip()]
+        return "\n".join("- " + " ".join(words) for words in lines)
@@ -1,17 +1,75 @@
 import asyncio
+import os
 import re
-from openai import OpenAI
+from pathlib import Path
 import logging
 import json
 
 
 class ChatGPT:
-    def __init__(self, api_key, assistant_id=None):
+    """
+    Non-blocking OpenAI client. All requests share one HTTP connection pool,
+    at most `max_concurrency` requests run at once, the rest wait for a slot.
+    """
+
+    def __init__(
+            self,
+            api_key,
+            assistant_id=None,
+            max_concurrency: int = 8,
+            max_connections: int = 20,
+            timeout: float = 60,
+            poll_interval_ms: int = 500
+        ):
         self.api_key = api_key
         self.assistant_id = assistant_id
-        self.client = OpenAI(api_key=self.api_key)
-        self.assistant = self.client.beta.assistants.retrieve(assistant_id=self.assistant_id)
+        self.poll_interval_ms = poll_interval_ms
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+        self._client_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._assistant = None
+        self._assistant_lock = asyncio.Lock()
+
+    def _create_client(self):
+        """Blocking, openai package takes noticeable time to import"""
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            timeout=httpx.Timeout(self.timeout, connect=10)
+        )
+        return AsyncOpenAI(api_key=self.api_key, http_client=http_client, timeout=self.timeout)
+
+    async def _get_client(self):
+        """Client is created on first use in a thread, so event loop keeps serving updates"""
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await asyncio.to_thread(self._create_client)
+        return self._client
+
+    async def get_assistant(self):
+        """Assistant is retrieved on first use"""
+        if self._assistant is None:
+            async with self._assistant_lock:
+                if self._assistant is None:
+                    client = await self._get_client()
+                    async with self._semaphore:
+                        self._assistant = await client.beta.assistants.retrieve(assistant_id=self.assistant_id)
+        return self._assistant
+
+    async def warm_up(self):
+        """Open pooled connection and retrieve assistant before first user request"""
+        await self._get_client()
+        if self.assistant_id:
+            await self.get_assistant()
 
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
 
     async def generate_workout(self, prompt: str):
         thread_id = await self.__create_thread()
@@ -20,40 +78,62 @@ class ChatGPT:
         return response_from_openai
 
     async def transcribe_audio_to_text(self, audio_file_path: str) -> str:
-        with open(audio_file_path, "rb") as audio_file:
-            transcription = self.client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file
+        audio = await asyncio.to_thread(Path(audio_file_path).read_bytes)
+        client = await self._get_client()
+        async with self._semaphore:
+            transcription = await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(os.path.basename(audio_file_path), audio)
             )
         print(f"Text for file: {audio_file_path} is:\n{transcription.text}")
         return transcription.text
 
+    async def complete(self, system: str, prompt: str, model: str = "gpt-4o-mini") -> str:
+        """Single chat completion, used by PostsSummarizer"""
+        client = await self._get_client()
+        async with self._semaphore:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        return response.choices[0].message.content or ""
+
     async def __create_thread(self):
-        thread = self.client.beta.threads.create()
+        client = await self._get_client()
+        async with self._semaphore:
+            thread = await client.beta.threads.create()
 
         thread_id = thread.id
 
         return thread_id
 
     async def __send_prompt(self, prompt: str, thread_id: str):
-        self.client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=prompt,
-        )
-        run = self.client.beta.threads.runs.create_and_poll(
-            thread_id=thread_id,
-            assistant_id=self.assistant.id
-        )
+        assistant = await self.get_assistant()
+        client = await self._get_client()
+        # Slot is held for whole run, polling sleeps without blocking event loop
+        async with self._semaphore:
+            await client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=prompt,
+            )
+            run = await client.beta.threads.runs.create_and_poll(
+                thread_id=thread_id,
+                assistant_id=assistant.id,
+                poll_interval_ms=self.poll_interval_ms
+            )
+
+            if run.status == "completed":
+                messages = await client.beta.threads.messages.list(thread_id=thread_id)
 
-        if run.status == "completed":
-            messages = self.client.beta.threads.messages.list(thread_id=thread_id)
-
-            for message in messages:
-                for component in message.content:
-                    if component.type == "text" and message.role == "assistant":
-                        response_json = json.loads(component.text.value)
-                        # print(response_json)
-                        return response_json
-        else:
-            logging.info("Run did not complete successfully.")
\ No newline at end of file
+                async for message in messages:
+                    for component in message.content:
+                        if component.type == "text" and message.role == "assistant":
+                            response_json = json.loads(component.text.value)
+                            # print(response_json)
+                            return response_json
+            else:
+                logging.info("Run did not complete successfully.")
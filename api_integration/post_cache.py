@@ -0,0 +1,279 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from api_integration.apify_api import ApifyService
+from api_integration.apify_resilience import ActorRunError
+from api_integration.records import PostRecord, MISSING
+from utils.dates import as_utc
+
+
+def _metric(value: int | None) -> int:
+    return MISSING if value is None else value
+
+
+class PostCache:
+    """
+    Read-through cache for X posts backed by Post table.
+    Profiles checked less than `ttl_minutes` ago are served from DB, others are scraped and saved back.
+    Scraping of a profile is leased in DB, so several bot processes don't scrape the same profile.
+    """
+    LEASE_KIND = "posts"
+    SKIPPED_FAILED = "failed"
+    SKIPPED_DEADLINE = "deadline"
+
+    def __init__(
+            self,
+            apify_service: ApifyService,
+            db,
+            ttl_minutes: int = 60,
+            since_hours: int = 24,
+            lease_ttl_seconds: int = 900,
+            lease_wait_seconds: int = 300
+        ):
+        self.apify_service = apify_service
+        self.db = db
+        self.ttl = timedelta(minutes=ttl_minutes)
+        self.since_hours = since_hours
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.lease_wait_seconds = lease_wait_seconds
+
+    @staticmethod
+    def _post_to_record(post, profile) -> PostRecord:
+        return PostRecord(
+            author=profile.username,
+            followers_count=_metric(profile.followers_count),
+            content=post.content,
+            url=post.post_url,
+            like_count=_metric(post.like_count),
+            reply_count=_metric(post.reply_count),
+            retweet_count=_metric(post.retweet_count),
+            view_count=_metric(post.view_count),
+            timestamp=as_utc(post.timestamp)
+        )
+
+    def _is_fresh(self, profile) -> bool:
+        if profile is None or profile.last_checked is None:
+            return False
+        return as_utc(profile.last_checked) >= datetime.now(timezone.utc) - self.ttl
+
+    async def _get_stored_posts(self, profiles: list, max_items: int) -> dict[str, list[PostRecord]]:
+        """Newest `max_items` stored posts of every profile"""
+        profiles_by_id = {profile.id: profile for profile in profiles}
+        stored_posts = await self.db.post_crud.get_all_recent_posts(list(profiles_by_id), self.since_hours)
+
+        results = {profile.username: [] for profile in profiles}
+        for post in sorted(stored_posts, key=lambda p: p.timestamp, reverse=True):
+            profile = profiles_by_id[post.profile_id]
+            if len(results[profile.username]) < max_items:
+                results[profile.username].append(self._post_to_record(post, profile))
+        return results
+
+    def _get_mark(self, profile) -> datetime | None:
+        """
+        High-water mark of profile: timestamp of the newest stored post, limited by cache window
+        """
+        if profile is None or profile.last_post_timestamp is None:
+            return None
+        window_start = datetime.now(timezone.utc) - timedelta(hours=self.since_hours)
+        return max(as_utc(profile.last_post_timestamp), window_start)
+
+    async def _scrape_posts(
+            self,
+            usernames: list[str],
+            max_items: int,
+            since: dict[str, datetime],
+            user_id: int = None,
+            deadline_at: float = None
+        ) -> tuple[dict[str, list[PostRecord]], dict[str, str]]:
+        """
+        Returns posts of scraped profiles and skipped profiles with reason: failed to be scraped
+        or not scraped before `deadline_at` (event loop time)
+        """
+        # One actor run per batch of profiles, concurrency is limited by scheduler of ApifyService
+        batches = self.apify_service.split_into_batches(usernames)
+        tasks = [
+            asyncio.ensure_future(self.apify_service.run_get_x_posts_batch(
+                x_profile_names=batch,
+                max_items=max_items,
+                since={name: since[name] for name in batch if name in since},
+                user_id=user_id
+            ))
+            for batch in batches
+        ]
+        print(f"Prepare tasks count: {len(tasks)}, start searching posts ...")
+        try:
+            timeout = None if deadline_at is None else max(0.0, deadline_at - asyncio.get_running_loop().time())
+            if tasks:
+                await asyncio.wait(tasks, timeout=timeout)
+        finally:
+            # Runs which missed deadline are cancelled (and aborted on Apify)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = {}
+        skipped = {}
+        for batch, task in zip(batches, tasks):
+            if task.cancelled():
+                skipped.update({name: self.SKIPPED_DEADLINE for name in batch})
+            elif isinstance(task.exception(), ActorRunError):
+                skipped.update({name: self.SKIPPED_FAILED for name in batch})
+            elif task.exception() is not None:
+                raise task.exception()
+            else:
+                # Profiles left out by batch were not scraped completely
+                results.update(task.result())
+                skipped.update({name: self.SKIPPED_FAILED for name in batch if name not in task.result()})
+        return results, skipped
+
+    async def _save_posts(self, scraped: dict[str, list[PostRecord]], profiles: dict):
+        """
+        Save scraped posts and mark profiles checked. Scraped profiles returned posts or are confirmed empty
+        (profiles which could be cut off by item limit of actor run are not in `scraped`, they stay stale).
+        """
+        posts_by_profile = {}
+        profile_values = {}
+        for username, posts in scraped.items():
+            profile = profiles.get(username)
+            if profile is None:
+                continue
+            posts_by_profile[profile.id] = posts
+            if not posts:
+                continue
+
+            newest_post = max(posts, key=lambda p: p.timestamp)
+            values = {
+                "last_post_timestamp": newest_post.timestamp,
+                "last_post_url": newest_post.url
+            }
+            if newest_post.followers_count != MISSING:
+                values["followers_count"] = newest_post.followers_count
+            profile_values[profile.id] = values
+
+        await self.db.post_crud.add_posts_bulk(posts_by_profile)
+        await self.db.profile_crud.mark_checked(list(posts_by_profile), profile_values)
+
+    async def _lease_stale_profiles(
+            self,
+            usernames: list[str],
+            profiles: dict,
+            owner: str,
+            deadline_at: float = None
+        ) -> set[int]:
+        """
+        Lease stale profiles for scraping. Profiles leased by other scrapes are awaited and re-read,
+        so their fresh posts are taken from DB. Returns ids of profiles leased by `owner`.
+        """
+        stale_ids = [
+            profiles[name].id for name in usernames
+            if name in profiles and not self._is_fresh(profiles[name])
+        ]
+        if not stale_ids:
+            return set()
+
+        leased_ids = await self.db.scrape_lease_crud.acquire_many(
+            stale_ids, self.LEASE_KIND, self.lease_ttl_seconds, owner
+        )
+        busy_ids = [profile_id for profile_id in stale_ids if profile_id not in leased_ids]
+        if busy_ids:
+            print(f"Posts of {len(busy_ids)} profiles are scraped by another worker, waiting")
+            wait_seconds = self.lease_wait_seconds
+            if deadline_at is not None:
+                wait_seconds = min(wait_seconds, max(0.0, deadline_at - asyncio.get_running_loop().time()))
+            await self.db.scrape_lease_crud.wait_released(busy_ids, self.LEASE_KIND, wait_seconds, owner)
+            busy_names = [profile.username for profile in profiles.values() if profile.id in busy_ids]
+            profiles.update(await self.db.profile_crud.get_by_usernames(busy_names))
+        return leased_ids
+
+    @staticmethod
+    def _merge_posts(stored: list[PostRecord], delta: list[PostRecord], max_items: int) -> list[PostRecord]:
+        """Newest `max_items` posts of stored posts and scraped delta"""
+        urls = {post.url for post in delta}
+        merged = delta + [post for post in stored if post.url not in urls]
+        return sorted(merged, key=lambda p: p.timestamp, reverse=True)[:max_items]
+
+    async def get_posts(
+            self,
+            usernames: list[str],
+            max_items: int = 20,
+            user_id: int = None,
+            deadline_at: float = None
+        ) -> tuple[dict[str, list[PostRecord]], dict[str, str]]:
+        """
+        Get recent posts for X profiles, scraping only profiles which are not fresh in DB.
+        Stale profiles with stored posts are scraped incrementally, after their newest stored post.
+        Scraping stops at `deadline_at` (event loop time).
+        Returns posts by profile name and profiles skipped because they failed to be scraped or missed deadline,
+        with reason (for them only already stored posts are returned).
+        """
+        try:
+            profiles = await self.db.profile_crud.get_by_usernames(usernames)
+        except Exception as e:
+            print(f"Failed to get profiles from DB: {e}")
+            profiles = {}
+
+        owner = self.db.scrape_lease_crud.new_owner()
+        try:
+            leased_ids = await self._lease_stale_profiles(usernames, profiles, owner, deadline_at)
+        except Exception as e:
+            print(f"Failed to lease profiles for scraping: {e}")
+            leased_ids = set()
+
+        try:
+            return await self._get_posts(usernames, profiles, max_items, user_id, deadline_at)
+        finally:
+            try:
+                await self.db.scrape_lease_crud.release_many(list(leased_ids), self.LEASE_KIND, owner)
+            except Exception as e:
+                print(f"Failed to release scraping leases: {e}")
+
+    async def _get_posts(
+            self,
+            usernames: list[str],
+            profiles: dict,
+            max_items: int,
+            user_id: int = None,
+            deadline_at: float = None
+        ) -> tuple[dict[str, list[PostRecord]], dict[str, str]]:
+        stale_usernames = [name for name in usernames if not self._is_fresh(profiles.get(name))]
+        stale_set = set(stale_usernames)
+        since = {name: self._get_mark(profiles.get(name)) for name in stale_usernames}
+        since = {name: mark for name, mark in since.items() if mark is not None}
+        # Fresh profiles and stale profiles with mark have usable posts in DB
+        stored_profiles = [
+            profiles[name] for name in usernames
+            if name in profiles and (name not in stale_set or name in since)
+        ]
+        print(f"Posts cache: {len(usernames) - len(stale_usernames)} fresh profiles, "
+              f"{len(stale_usernames)} to scrape ({len(since)} incrementally)")
+
+        results = {name: [] for name in usernames}
+        if stored_profiles:
+            try:
+                results.update(await self._get_stored_posts(stored_profiles, max_items))
+            except Exception as e:
+                print(f"Failed to get posts from DB: {e}")
+                stale_usernames = usernames
+                since = {}
+
+        skipped = {}
+        if stale_usernames:
+            scraped, skipped = await self._scrape_posts(stale_usernames, max_items, since, user_id, deadline_at)
+            for name, delta in scraped.items():
+                results[name] = self._merge_posts(results.get(name, []), delta, max_items)
+            try:
+                await self._save_posts(scraped, profiles)
+            except Exception as e:
+                print(f"Failed to save posts to DB: {e}")
+
+        # Serve outdated posts from DB for skipped profiles
+        stored_set = {profile.username for profile in stored_profiles}
+        fallback_profiles = [profiles[name] for name in skipped if name in profiles and name not in stored_set]
+        if fallback_profiles:
+            try:
+                results.update(await self._get_stored_posts(fallback_profiles, max_items))
+            except Exception as e:
+                print(f"Failed to get posts from DB: {e}")
+
+        return results, skipped
@@ -0,0 +1,170 @@
+import time
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+
+# Metric value for posts where actor didn't return it
+MISSING = -1
+TWITTER_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+_MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12
+}
+
+
+@lru_cache(maxsize=64)
+def _parse_offset(offset: str) -> timezone:
+    if offset == "+0000":
+        return timezone.utc
+    sign = -1 if offset[0] == "-" else 1
+    return timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5])))
+
+
+def parse_twitter_timestamp(value: str) -> datetime:
+    """
+    Parse fixed Twitter format 'Wed Oct 10 20:19:24 +0000 2018' without strptime
+    """
+    try:
+        _, month, day, clock, offset, year = value.split(" ")
+        return datetime(
+            int(year), _MONTHS[month], int(day),
+            int(clock[0:2]), int(clock[3:5]), int(clock[6:8]),
+            tzinfo=_parse_offset(offset)
+        )
+    except (ValueError, KeyError, IndexError):
+        return datetime.strptime(value, TWITTER_TIME_FORMAT)
+
+
+def _metric(value) -> int:
+    return value if isinstance(value, int) else MISSING
+
+
+def metric_text(value: int) -> str:
+    return "Not found" if value == MISSING else str(value)
+
+
+class PostRecord:
+    __slots__ = (
+        "author", "followers_count", "content", "url",
+        "like_count", "reply_count", "retweet_count", "view_count", "timestamp"
+    )
+
+    def __init__(
+            self,
+            author: str,
+            followers_count: int,
+            content: str,
+            url: str,
+            like_count: int,
+            reply_count: int,
+            retweet_count: int,
+            view_count: int,
+            timestamp: datetime
+        ):
+        self.author = author
+        self.followers_count = followers_count
+        self.content = content
+        self.url = url
+        self.like_count = like_count
+        self.reply_count = reply_count
+        self.retweet_count = retweet_count
+        self.view_count = view_count
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_actor_item(cls, item: dict) -> "PostRecord":
+        author = item["author"]
+        return cls(
+            author=author.get("userName", "Not found"),
+            followers_count=_metric(author.get("followers")),
+            content=item["text"],
+            url=item["url"],
+            like_count=_metric(item.get("likeCount")),
+            reply_count=_metric(item.get("replyCount")),
+            retweet_count=_metric(item.get("retweetCount")),
+            view_count=_metric(item.get("viewCount")),
+            timestamp=parse_twitter_timestamp(item["createdAt"])
+        )
+
+    def __repr__(self):
+        return f"PostRecord(author={self.author!r}, url={self.url!r}, timestamp={self.timestamp!r})"
+
+
+class FollowingRecord:
+    __slots__ = ("username", "full_name", "twitter_id", "followers_count")
+
+    def __init__(self, username: str, full_name: str | None, twitter_id: int, followers_count: int = MISSING):
+        self.username = username
+        self.full_name = full_name
+        self.twitter_id = twitter_id
+        self.followers_count = followers_count
+
+    @classmethod
+    def from_actor_item(cls, item: dict) -> "FollowingRecord":
+        return cls(
+            username=item["userName"],
+            full_name=item["name"],
+            twitter_id=item["id"],
+            followers_count=_metric(item.get("followers"))
+        )
+
+    def __repr__(self):
+        return f"FollowingRecord(username={self.username!r})"
+
+
+# Micro-benchmark: dict posts with strptime vs PostRecord with fast parsing
+
+def _map_post_dict(post: dict) -> dict:
+    """Previous mapping of actor item"""
+    return {
+        "author": post["author"].get("userName", "Not found"),
+        "followers_count": post["author"].get("followers", "Not found"),
+        "content": post["text"],
+        "url": post["url"],
+        "likeCount": post.get("likeCount", "Not found"),
+        "replyCount": post.get("replyCount", "Not found"),
+        "retweetCount": post.get("retweetCount", "Not found"),
+        "viewCount": post.get("viewCount", "Not found"),
+        "timestamp": datetime.strptime(post["createdAt"], TWITTER_TIME_FORMAT)
+    }
+
+
+def _measure(mapper, items: list[dict]) -> tuple[float, int]:
+    # Time and memory are measured in separate passes, tracemalloc slows down allocations
+    start = time.perf_counter()
+    mapped = [mapper(item) for item in items]
+    duration = time.perf_counter() - start
+    del mapped
+
+    tracemalloc.start()
+    mapped = [mapper(item) for item in items]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del mapped
+    return duration, memory
+
+
+def main(count: int = 100_000):
+    now = datetime.now(timezone.utc)
+    items = [
+        {
+            "author": {"userName": f"user{i % 100}", "followers": 1000 + i},
+            "text": f"Post {i}",
+            "url": f"https://x.com/user{i % 100}/status/{i}",
+            "likeCount": i, "replyCount": i, "retweetCount": i,
+            "viewCount": None if i % 3 else i,
+            "createdAt": (now - timedelta(seconds=i)).strftime(TWITTER_TIME_FORMAT)
+        }
+        for i in range(count)
+    ]
+
+    dict_time, dict_memory = _measure(_map_post_dict, items)
+    record_time, record_memory = _measure(PostRecord.from_actor_item, items)
+    print(f"{count} posts")
+    print(f"dict + strptime:  {dict_time:.3f}s, {dict_memory / 1024 / 1024:.1f} MiB")
+    print(f"PostRecord:       {record_time:.3f}s, {record_memory / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
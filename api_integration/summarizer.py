@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from api_integration.records import PostRecord
+from utils.tokens import TokenCounter
+
+MAP_PROMPT = (
+    "You summarize posts from X (Twitter). Write a short digest of the key news and opinions in these posts, "
+    "grouped by topic, mention authors with @. Answer in language with code '{language}'."
+)
+REDUCE_PROMPT = (
+    "You combine partial digests of posts from X (Twitter) into one digest of the day. Merge repeated topics, "
+    "keep the most important news first, mention authors with @. Answer in language with code '{language}'."
+)
+
+
+class PostsSummarizer:
+    """
+    Map-reduce summarization of posts: posts are packed into chunks of at most `chunk_tokens` tokens,
+    chunks are summarized concurrently (at most `concurrency` LLM calls), then summaries are reduced into one digest.
+    `llm` is any object with `async complete(system, prompt, model) -> str` (ChatGPT or FakeLLM).
+    """
+
+    def __init__(
+            self,
+            llm,
+            token_counter: TokenCounter,
+            chunk_tokens: int = 3000,
+            concurrency: int = 4,
+            model: str = "gpt-4o-mini"
+        ):
+        self.llm = llm
+        self.token_counter = token_counter
+        self.chunk_tokens = chunk_tokens
+        self.model = model
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    @staticmethod
+    def _render_post(post: PostRecord) -> str:
+        return f"@{post.author}: {' '.join(post.content.split())}"
+
+    async def pack_chunks(self, texts: list[str]) -> list[str]:
+        """Pack texts in order into chunks under token budget, text longer than budget is truncated"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for text, tokens in zip(texts, await self.token_counter.count_batch(texts)):
+            if tokens > self.chunk_tokens:
+                text = await self.token_counter.truncate(text, self.chunk_tokens)
+                tokens = self.chunk_tokens
+            if current and current_tokens + tokens + 1 > self.chunk_tokens:
+                chunks.append("\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens + 1  # newline
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    async def _complete(self, system: str, prompt: str) -> str:
+        async with self._semaphore:
+            return await self.llm.complete(system, prompt, model=self.model)
+
+    async def summarize(self, posts: list[PostRecord], language: str = "en") -> str:
+        if not posts:
+            return ""
+        start = time.perf_counter()
+        chunks = await self.pack_chunks([self._render_post(post) for post in posts])
+        system = MAP_PROMPT.format(language=language)
+        summaries = await asyncio.gather(*[self._complete(system, chunk) for chunk in chunks])
+        print(f"Summarized {len(posts)} posts in {len(chunks)} chunks: {time.perf_counter() - start:.2f}s")
+
+        # Reduce level by level until summaries fit into one chunk
+        system = REDUCE_PROMPT.format(language=language)
+        while len(summaries) > 1:
+            chunks = await self.pack_chunks(summaries)
+            if len(chunks) >= len(summaries):
+                # Every summary fills a chunk, reduce them in pairs, each half of a pair gets half of the budget
+                half = max(1, (self.chunk_tokens - 1) // 2)
+                halves = await asyncio.gather(*[self.token_counter.truncate(summary, half) for summary in summaries])
+                chunks = ["\n".join(halves[i:i + 2]) for i in range(0, len(halves), 2)]
+            summaries = await asyncio.gather(*[self._complete(system, chunk) for chunk in chunks])
+        print(f"Digest of {len(posts)} posts: {time.perf_counter() - start:.2f}s")
+        return summaries[0]
@@ -1,6 +1,59 @@
+import asyncio
 import logging
-from bot.main import bot_dp, bot, user_router
+import signal
+from aiohttp import web
+from bot.main import bot_dp, bot, user_router, summary_jobs, bot_stats
 from bot.handlers.user_handlers import register_user_handlers
+from bot.handlers.steps import SummaryCreationSteps
+from bot.settings import BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, \
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, SHARD_INDEX, SHARD_COUNT
+from bot.webhook import WebhookServer
+from utils.startup import startup_report
+
+
+async def run_webhook():
+    """
+    Serve updates on aiohttp server of this process. FSM hot tier and request quota are kept in memory,
+    so updates of a user must always reach the same process: run one process, or N shards under supervisor.py
+    (it routes updates by user id), never several processes behind a plain load balancer.
+    """
+    server = WebhookServer(
+        dispatcher=bot_dp,
+        bot=bot,
+        path=WEBHOOK_PATH,
+        secret=WEBHOOK_SECRET,
+        workers=WEBHOOK_WORKERS,
+        max_queue_size=WEBHOOK_QUEUE_SIZE,
+        stats_provider=bot_stats
+    )
+    with startup_report.phase("webhook server"):
+        runner = web.AppRunner(server.create_app())
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    print(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    # Shards of supervisor run with empty WEBHOOK_URL, webhook of Telegram is registered by supervisor
+    if WEBHOOK_URL:
+        with startup_report.phase("set webhook"):
+            await bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=bot_dp.resolve_used_update_types()
+            )
+    print(startup_report.report())
+
+    # SIGTERM stops server gracefully: dispatcher shutdown hooks flush FSM storage and quota
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        print(f"Webhook stats: {server.stats()}")
+        await runner.cleanup()
+        await bot.session.close()
 
 
 async def exe_bot():
@@ -8,7 +61,19 @@ async def exe_bot():
     print('BOT started')
     logging.info(msg="BOT started")
 
-    await register_user_handlers(router=user_router)
+    with startup_report.phase("handlers"):
+        await register_user_handlers(router=user_router)
+    with startup_report.phase("summary jobs restore"):
+        await summary_jobs.start(
+            handler=SummaryCreationSteps.run_summary_job,
+            shard_index=SHARD_INDEX,
+            shard_count=SHARD_COUNT
+        )
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await bot_dp.start_polling(bot)
+    if BOT_MODE == "webhook":
+        await run_webhook()
+    else:
+        with startup_report.phase("delete webhook"):
+            await bot.delete_webhook(drop_pending_updates=True)
+        print(startup_report.report())
+        await bot_dp.start_polling(bot)
@@ -1,16 +1,18 @@
 import os
 import time
-import uuid
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
 import asyncio
 import aiohttp
-import tiktoken
 import bot.texts as texts
 import bot.keyboards as keyboards
 from aiogram.types import Message, CallbackQuery, Voice
 from aiogram.fsm.context import FSMContext
 import bot.states as states
-from bot.main import gpt, youtube, db, bot, apify_service
+from bot.main import gpt, youtube, db, bot, bot_dp, apify_service, post_cache, request_quota, summary_jobs, \
+    summarizer
+from api_integration.apify_resilience import ActorRunError
+from api_integration.records import PostRecord, FollowingRecord
+from utils.documents import render_posts_documents
 from bot.states import TwitterSummaryState
 from bot.texts import warm_up_cool_down_message, exercise_text
 import bot.filters as filters
@@ -19,15 +21,28 @@ from utils.functions import get_user_language, get_language_from_state, get_plac
 from aiogram.filters.command import Command
 import re
 from datetime import datetime, timedelta, timezone
-from bot.settings import TELEGRAM_CHANNEL_ID, BOT_TOKEN
+from bot.settings import TELEGRAM_CHANNEL_ID, BOT_TOKEN, SCRAPE_LEASE_TTL_SECONDS, SCRAPE_LEASE_WAIT_SECONDS, \
+    SUMMARY_TIME_BUDGET_SECONDS, POSTS_DOCUMENT_COMPRESSION, POSTS_DOCUMENT_MAX_BYTES
 
+FOLLOWINGS_LEASE_KIND = "followings"
+# Telegram limit for message text
+MESSAGE_MAX_LENGTH = 4096
 
 
-async def count_tokens(text: str) -> int:
-    """Count tokens in text"""
-    encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(text)
-    return len(tokens)
+
+async def send_long_message(chat_id: int, text: str):
+    """Send plain text (without HTML parsing) split by lines into messages under Telegram length limit"""
+    parts = [""]
+    for line in text.splitlines(keepends=True):
+        while line:
+            if len(parts[-1]) + len(line) > MESSAGE_MAX_LENGTH and parts[-1]:
+                parts.append("")
+            free = MESSAGE_MAX_LENGTH - len(parts[-1])
+            parts[-1] += line[:free]
+            line = line[free:]
+    for part in parts:
+        if part.strip():
+            await bot.send_message(chat_id, text=part, parse_mode=None)
 
 
 async def send_telegram_message_to_channel(text: str):
@@ -56,23 +71,18 @@ async def process_voice_message(message: Message) -> str:
     os.remove(voice_path)
     return text
 
-async def get_posts_created_today(posts: list[dict]) -> list[dict]:
+async def get_posts_created_today(posts: list[PostRecord]) -> list[PostRecord]:
     """
     Get X posts created today
     """
     now = datetime.now(tz=timezone.utc)
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    filtered_posts_today = [
-        post for post in posts
-        if isinstance(post, dict)
-        and isinstance(post.get("timestamp"), datetime)
-        and post["timestamp"] >= today_start
-    ]
+    filtered_posts_today = [post for post in posts if post.timestamp >= today_start]
     return filtered_posts_today
 
 
-async def get_posts_created_24h_ago(posts: list[dict]) -> list[dict]:
+async def get_posts_created_24h_ago(posts: list[list[PostRecord]]) -> list[PostRecord]:
     """
     Get X posts created 24 hours ago
     """
@@ -83,20 +93,23 @@ async def get_posts_created_24h_ago(posts: list[dict]) -> list[dict]:
         post
         for result in posts if result
         for post in result
-        if post["timestamp"] >= last_24h
+        if post.timestamp >= last_24h
     ]
     return filtered_posts_24h
 
 
-async def save_posts_to_txt(posts: list[dict]) -> str:
-    filename = f"{uuid.uuid4().hex}.txt"
-    filepath = f"/tmp/{filename}"
-
-    with open(filepath, "w", encoding="utf-8") as f:
-        for i, post in enumerate(posts, start=1):
-            f.write(f"Post {i} by @{post['author']} who has: \n{post['followers_count']} followers\n{post['likeCount']} likes\n{post['viewCount']} views\n{post['replyCount']} replies\n{post['retweetCount']} retweets:\n{post['content']}\n\n")
-
-    return filepath
+async def build_posts_documents(posts: list[PostRecord]) -> list[BufferedInputFile]:
+    """
+    Render posts into in-memory documents (split by Telegram size limit) in a thread, so event loop isn't blocked
+    """
+    filename = f"posts_{datetime.now(tz=timezone.utc):%Y-%m-%d}.txt"
+    return await asyncio.to_thread(
+        render_posts_documents,
+        posts,
+        filename=filename,
+        compression=POSTS_DOCUMENT_COMPRESSION or None,
+        max_bytes=POSTS_DOCUMENT_MAX_BYTES
+    )
 
 
 class UserRegistrationSteps:
@@ -137,9 +150,9 @@ class SummaryCreationSteps:
         language_code = user_info.get("chosen_language", "en")
 
         # Check requests
-        requests_count = await db.user_request_crud.get_requests_count(user_id=user_id)
+        requests_count = request_quota.count(user_id)
         print(f"Requests count: {requests_count}")
-        if requests_count >= 10:
+        if not request_quota.is_allowed(user_id):
             message_text = texts.too_many_requests_message.get(language_code)
             await message.answer(text=message_text)
             await state.clear()
@@ -153,155 +166,253 @@ class SummaryCreationSteps:
         else:
             text = message.text.strip()
 
-        # token_count = await count_tokens(text)
-        # print(f"Token count: {token_count}, for text: {text}")
-        # if token_count > 200:
-        #     error_text = texts.too_long_request.get(language_code)
-        #     await message.answer(error_text)
-        #     await state.clear()
-        #     return False
-
         return text
 
     @staticmethod
-    async def generate_summary(message: Message, state: FSMContext, instruction: str):
-        user_id = message.from_user.id
-        data = await state.get_data()
-        user_info = data.get(f"user_{user_id}")
-        language_code = user_info.get("chosen_language", "en")
-        print(f"User message: {instruction}")
-        MAX_FOLLOWINGS = 100  # Max Followings setting !
-        MAX_POSTS = 10  # Max Posts setting !
-        MAX_WORKERS = 15 # Max Apify workers for 1 user !
-        GET_FOLLOWING_FROM_DB = False
+    async def load_following_profiles(profile_id: int) -> list[FollowingRecord]:
+        start_time = time.perf_counter()
+        friends = await db.friend_crud.get_following_profiles(profile_id)
+        following_profiles = [
+            FollowingRecord(username=friend.username, full_name=friend.full_name, twitter_id=friend.twitter_id)
+            for friend in friends
+        ]
+        duration = time.perf_counter() - start_time
+        print(f"Get {len(following_profiles)} following profiles from DB: {duration:.2f}s")
+        return following_profiles
 
-        message_text = texts.generating_summary_text.get(language_code)
-        await message.answer(text=message_text)
-        await state.set_state(TwitterSummaryState.generating)
-        # Save request
-        await db.user_request_crud.save_request(user_id=user_id)
+    @staticmethod
+    async def save_following_profiles(profile, instruction: str, following_profiles: list[FollowingRecord]):
+        try:
+            print(f"Try to save following profiles to DB")
+            start_time = time.perf_counter()
 
-        # 1 Get Following profiles for X profile
+            # Prepare list of all friends for bulk saving
+            all_profiles = following_profiles + [FollowingRecord(
+                username=instruction,
+                full_name=None,
+                twitter_id=profile.twitter_id
+            )]
+
+            friends_profile_ids = await db.profile_crud.bulk_save_profiles(all_profiles)
+
+            duration = time.perf_counter() - start_time
+            print(f"Saved following profiles to DB: {duration:.2f}s")
+
+            await db.friend_crud.add_friends(profile.id, friends_profile_ids)
+
+        except Exception as e:
+            print(f"Failed to save following profiles to DB: {e}")
+
+    @staticmethod
+    async def get_following_profiles(instruction: str, user_id: int, max_followings: int) -> list[FollowingRecord]:
+        """
+        Get following profiles of X profile from DB, or scrape and save them.
+        Scraping is leased in DB, so only one bot process scrapes followings of the same profile.
+        """
         # --- Check profile in DB ---
         try:
             profile = await db.profile_crud.get_by_username(instruction)
             print(f"Profile found in DB: {profile}")
+            if profile:
+                following_profiles = await SummaryCreationSteps.load_following_profiles(profile.id)
+                if following_profiles:
+                    return following_profiles
+                # No friends saved, need to scrape
+                print(f"No friends saved for user: {instruction}, need to scrape")
+
+            else:
+                print(f"Profile not found in DB: {instruction}, need to scrape")
+                # Save X profile separately, twitter_id can be updated later
+                profile = await db.profile_crud.create(username=instruction, twitter_id=0)
 
         except Exception as e:
             print(f"Failed to get profile from DB: {e}")
             profile = None
 
+        lease_acquired = False
+        lease_owner = db.scrape_lease_crud.new_owner()
         if profile:
-            friends_ids = await db.friend_crud.get_friends(profile.id)
-            print(f"Friends ids: {friends_ids}")
-            if friends_ids:
-                start_time = time.perf_counter()
-                # Get Profile objects of friends
-                following_profiles = []
-                for friend_id in friends_ids:
-                    friend = await db.profile_crud.get(friend_id)
-                    if friend:
-                        following_profiles.append({
-                            "username": friend.username,
-                            "full_name": friend.full_name,
-                            "twitter_id": friend.twitter_id
-                        })
-                duration = time.perf_counter() - start_time
-                print(f"Get following profiles from DB: {duration:.2f}s")
-                GET_FOLLOWING_FROM_DB = True
+            try:
+                lease_acquired = await db.scrape_lease_crud.try_acquire(
+                    profile.id, FOLLOWINGS_LEASE_KIND, SCRAPE_LEASE_TTL_SECONDS, lease_owner
+                )
+                if not lease_acquired:
+                    print(f"Followings of {instruction} are scraped by another worker, waiting")
+                    await db.scrape_lease_crud.wait_released(
+                        [profile.id], FOLLOWINGS_LEASE_KIND, SCRAPE_LEASE_WAIT_SECONDS, lease_owner
+                    )
+                    following_profiles = await SummaryCreationSteps.load_following_profiles(profile.id)
+                    if following_profiles:
+                        return following_profiles
 
-            else:
-                # No friends saved, need to scrape
-                print(f"No friends saved for user: {instruction}, need to scrape")
-                following_profiles = await apify_service.run_get_x_followings_actor(x_profile_name=instruction, max_items=MAX_FOLLOWINGS)
-        
-        else:
-            print(f"Profile not found in DB: {instruction}, need to scrape")
-            following_profiles = await apify_service.run_get_x_followings_actor(x_profile_name=instruction, max_items=MAX_FOLLOWINGS)
+            except Exception as e:
+                print(f"Failed to lease followings scraping: {e}")
 
-        print(f"Following profiles len: {len(following_profiles)}")
-        if len(following_profiles) == 0:
-            await message.answer(text=f"No following profiles found for user: {instruction}")
-            last_message = texts.finish_message.get(language_code)
-            await message.answer(text=last_message)
-            await state.set_state(TwitterSummaryState.selecting_profile)
+        try:
+            following_profiles = await apify_service.run_get_x_followings_actor(
+                x_profile_name=instruction,
+                max_items=max_followings,
+                user_id=user_id
+            )
+            if following_profiles and profile:
+                await SummaryCreationSteps.save_following_profiles(profile, instruction, following_profiles)
+            return following_profiles
+
+        finally:
+            if lease_acquired:
+                try:
+                    await db.scrape_lease_crud.release_many([profile.id], FOLLOWINGS_LEASE_KIND, lease_owner)
+                except Exception as e:
+                    print(f"Failed to release followings lease: {e}")
+
+    @staticmethod
+    async def generate_summary(message: Message, state: FSMContext, instruction: str):
+        """
+        Queue summary job, it is executed by summary job workers (see run_summary_job)
+        """
+        user_id = message.from_user.id
+        data = await state.get_data()
+        user_info = data.get(f"user_{user_id}")
+        language_code = user_info.get("chosen_language", "en")
+        print(f"User message: {instruction}")
+
+        try:
+            job = await summary_jobs.submit(
+                user_id=user_id,
+                chat_id=message.chat.id,
+                instruction=instruction,
+                language=language_code
+            )
+        except asyncio.QueueFull:
+            await message.answer(text="Too many summaries are being generated now, please try later")
             return
 
-        else:
-            # TODO save to DB following profiles
-            if GET_FOLLOWING_FROM_DB is False:
-                try:
-                    print(f"Try to save following profiles to DB")
-                    start_time = time.perf_counter()
+        # Save request
+        request_quota.record(user_id)
+        await state.set_state(TwitterSummaryState.generating)
+        message_text = texts.generating_summary_text.get(language_code)
+        await message.answer(text=message_text)
+        print(f"Summary job {job.id} queued, queue stats: {summary_jobs.stats()}")
+        if summary_jobs.depth > summary_jobs.workers:
+            await message.answer(text=f"Your request is in queue, position: {summary_jobs.depth - summary_jobs.workers}")
+
+    @staticmethod
+    async def run_summary_job(job):
+        """
+        Scrape followings and their posts for queued summary job and send result to the chat
+        """
+        chat_id = job.chat_id
+        user_id = job.user_id
+        instruction = job.instruction
+        language_code = job.language or "en"
+        state = bot_dp.fsm.get_context(bot=bot, chat_id=chat_id, user_id=user_id)
+        MAX_FOLLOWINGS = 100  # Max Followings setting !
+        MAX_POSTS = 10  # Max Posts setting !
 
-                    # Save X profile separately, if it doesn't exist
-                    profile = await db.profile_crud.get_by_username(instruction)
-                    if not profile:
-                        profile = await db.profile_crud.create(username=instruction, twitter_id=0)  # can be updated later
+        try:
+            await SummaryCreationSteps._run_summary_job(
+                job.id, chat_id, user_id, instruction, language_code, MAX_FOLLOWINGS, MAX_POSTS
+            )
+        except asyncio.CancelledError:
+            # Job stopped at shutdown is released and runs again after restart, user is not told it finished
+            raise
+        except Exception:
+            await bot.send_message(chat_id, text=f"Failed to generate summary for user: {instruction}, please try later")
+            await SummaryCreationSteps._finish_summary_job(chat_id, language_code, state)
+            raise
+        await SummaryCreationSteps._finish_summary_job(chat_id, language_code, state)
 
-                    # Prepare list of all friends for bulk saving
-                    all_profiles = following_profiles + [{
-                        "username": instruction,
-                        "full_name": None,
-                        "twitter_id": profile.twitter_id
-                    }]
+    @staticmethod
+    async def _finish_summary_job(chat_id: int, language_code: str, state: FSMContext):
+        last_message = texts.finish_message.get(language_code)
+        await bot.send_message(chat_id, text=last_message)
+        await state.set_state(TwitterSummaryState.selecting_profile)
 
-                    friends_profile_ids = await db.profile_crud.bulk_save_profiles(all_profiles)
-                    
-                    duration = time.perf_counter() - start_time
-                    print(f"Saved following profiles to DB: {duration:.2f}s")
+    @staticmethod
+    async def _run_summary_job(
+            job_id: int,
+            chat_id: int,
+            user_id: int,
+            instruction: str,
+            language_code: str,
+            max_followings: int,
+            max_posts: int
+        ):
+        # Whole request must fit into time budget, profiles which miss it are skipped
+        deadline_at = asyncio.get_running_loop().time() + SUMMARY_TIME_BUDGET_SECONDS
 
-                    await db.friend_crud.add_friends(profile.id, friends_profile_ids)
+        # 1 Get Following profiles for X profile
+        await bot.send_message(chat_id, text=f"Getting profiles followed by {instruction} ...")
+        try:
+            following_profiles = await asyncio.wait_for(
+                SummaryCreationSteps.get_following_profiles(
+                    instruction=instruction,
+                    user_id=user_id,
+                    max_followings=max_followings
+                ),
+                timeout=SUMMARY_TIME_BUDGET_SECONDS
+            )
+        except (ActorRunError, asyncio.TimeoutError) as e:
+            print(f"Failed to get following profiles for {instruction}: {e!r}")
+            await bot.send_message(chat_id, text=f"Failed to get following profiles for user: {instruction}, please try later")
+            return
 
-                except Exception as e:
-                    print(f"Failed to save following profiles to DB: {e}")
-
-            # Get information about posts (max workers 125!)
-            semaphore = asyncio.Semaphore(MAX_WORKERS)
-
-            async def limited_run(profile_username: str, max_items: int):
-                """
-                For limited run scraping posts
-                """
-                async with semaphore:
-                    return await apify_service.run_get_x_posts(
-                        x_profile_name=profile_username,
-                        max_items=max_items
-                    )
-            
-            tasks = [limited_run(profile["username"], MAX_POSTS) for profile in following_profiles]
-            print(f"Prepare tasks count: {len(tasks)}, start searching posts ...")
-            results_nested = await asyncio.gather(*tasks)
-            posts = [post for result in results_nested if result for post in result]
-            print(f"Find posts after scraping len: {len(posts)}")
-    
+        print(f"Following profiles len: {len(following_profiles)}")
+        if len(following_profiles) == 0:
+            await bot.send_message(chat_id, text=f"No following profiles found for user: {instruction}")
+            return
+
+        # 2 Get information about posts (runs are limited by process-wide scheduler), fresh profiles are read from DB
+        await bot.send_message(chat_id, text=f"Collecting posts of {len(following_profiles)} profiles ...")
+        posts_by_profile, skipped_profiles = await post_cache.get_posts(
+            usernames=[profile.username for profile in following_profiles],
+            max_items=max_posts,
+            user_id=user_id,
+            deadline_at=deadline_at
+        )
+        print(f"Apify stats: {apify_service.stats()}")
+        if skipped_profiles:
+            timed_out = [name for name, reason in skipped_profiles.items() if reason == post_cache.SKIPPED_DEADLINE]
+            failed = [name for name, reason in skipped_profiles.items() if reason == post_cache.SKIPPED_FAILED]
+            skipped_text = "New posts were not fetched for some profiles, only saved posts are used for them."
+            if timed_out:
+                skipped_text += f"\nToo slow ({len(timed_out)}): {', '.join(timed_out)}"
+            if failed:
+                skipped_text += f"\nFailed ({len(failed)}): {', '.join(failed)}"
+            await bot.send_message(chat_id, text=skipped_text)
+        posts = [post for posts_list in posts_by_profile.values() for post in posts_list]
+        print(f"Find posts after scraping len: {len(posts)}")
+
+        if posts:
             print(f"First post:\n{posts[0]}\n")
             print(f"Last post:\n{posts[-1]}\n")
 
-            filtered_posts_today = await get_posts_created_today(posts)
-            print(f"Filtered posts (today) len: {len(filtered_posts_today)}")
-            # filtered_posts_24h_ago = await get_posts_created_24h_ago(posts)
-            # print(f"Filtered posts (24h ago) len: {len(filtered_posts_24h_ago)}")
-
-            # TODO save to DB posts
-            if filtered_posts_today:
-                filepath = await save_posts_to_txt(filtered_posts_today)
-                file = FSInputFile(filepath)
-                await message.answer_document(file, caption="All posts for today 📄")
+        filtered_posts_today = await get_posts_created_today(posts)
+        print(f"Filtered posts (today) len: {len(filtered_posts_today)}")
+        # filtered_posts_24h_ago = await get_posts_created_24h_ago(posts)
+        # print(f"Filtered posts (24h ago) len: {len(filtered_posts_24h_ago)}")
+
+        if filtered_posts_today:
+            documents = await build_posts_documents(filtered_posts_today)
+            for number, document in enumerate(documents, start=1):
+                caption = "All posts for today 📄"
+                if len(documents) > 1:
+                    caption += f" ({number}/{len(documents)})"
+                await bot.send_document(chat_id, document, caption=caption)
+
+            # 3 Digest of posts, documents are already sent if summarization fails
+            await bot.send_message(chat_id, text=f"Summarizing {len(filtered_posts_today)} posts ...")
+            try:
+                digest = await summarizer.summarize(filtered_posts_today, language=language_code)
+            except Exception as e:
+                print(f"Failed to summarize posts for {instruction}: {e!r}")
+                await bot.send_message(chat_id, text="Failed to summarize posts, please try later")
+                return
+            await db.summary_crud.create_summary(session_id=job_id, summary_text=digest)
+            await send_long_message(chat_id, digest)
 
-            else:
-                await message.answer("No posts found for today 😕")
-            
-            # for numb_post, post in enumerate(filtered_posts_today, start=1):
-                
-            #     post_content = f"Post {numb_post}:\n{post['content']}"
-            #     print(f"Answer for client: {post_content}")
-            #     await message.answer(text=post_content)
-            
-
-        last_message = texts.finish_message.get(language_code)
-        await message.answer(text=last_message)
-        await state.set_state(TwitterSummaryState.selecting_profile)
+        else:
+            await bot.send_message(chat_id, text="No posts found for today 😕")
 
     @staticmethod
     async def get_profile_info_step(message: Message, state: FSMContext):
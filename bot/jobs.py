@@ -0,0 +1,169 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from db.models.search_session import SearchSession
+from utils.dates import as_utc
+from utils.stats import mean, percentile
+
+
+class SummaryJobQueue:
+    """
+    Summary jobs persisted in search_sessions table and executed by a pool of async workers.
+    Jobs are owned by this queue while it heartbeats them, so several processes on one DB don't run a job twice.
+    Unfinished jobs without live owner (released on stop, or of crashed process) are claimed on start and then
+    on every heartbeat.
+    """
+
+    BATCH_CLAIM_LIMIT = 1000
+
+    def __init__(
+            self,
+            search_session_crud,
+            workers: int = 4,
+            max_queue_size: int = 1000,
+            lease_seconds: float = 60,
+            stats_window: int = 1000
+        ):
+        self.search_session_crud = search_session_crud
+        self.workers = max(1, workers)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self._shard = (0, 1)
+        self._heartbeat_task: asyncio.Task | None = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._handler: Callable[[SearchSession], Awaitable] | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        # Queue slots taken by submits and claims which wait for DB
+        self._reserved = 0
+        self._running = 0
+        self._waits = deque(maxlen=stats_window)
+        self._run_times = deque(maxlen=stats_window)
+        self.done = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def start(self, handler: Callable[[SearchSession], Awaitable], shard_index: int = 0, shard_count: int = 1):
+        """Start workers, only jobs of users of this shard (user_id % shard_count) are claimed"""
+        self._handler = handler
+        self._shard = (shard_index, shard_count)
+        claimed = await self._claim()
+        if claimed:
+            print(f"Summary jobs: claimed {claimed} unfinished jobs")
+        self._worker_tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    def _reserve(self, count: int) -> int:
+        """
+        Reserve up to `count` queue slots before jobs are written to DB, returns number of reserved slots.
+        Concurrent submits and claims can't fill the queue while they wait, so owned jobs always fit into it.
+        """
+        if self._queue.maxsize > 0:
+            count = max(0, min(count, self._queue.maxsize - self._queue.qsize() - self._reserved))
+        self._reserved += count
+        return count
+
+    async def _claim(self) -> int:
+        free = self._reserve(self.BATCH_CLAIM_LIMIT)
+        if not free:
+            return 0
+        try:
+            jobs = await self.search_session_crud.claim_unfinished_jobs(
+                self.owner, self.lease_seconds, free, *self._shard
+            )
+        finally:
+            self._reserved -= free
+        for job in jobs:
+            self._queue.put_nowait(job)
+        return len(jobs)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.search_session_crud.heartbeat(self.owner)
+                claimed = await self._claim()
+                if claimed:
+                    print(f"Summary jobs: claimed {claimed} jobs of stopped workers")
+            except Exception as e:
+                print(f"Summary jobs heartbeat failed: {e!r}")
+
+    async def close(self):
+        # Running jobs stay in 'running' status, they are released to be claimed by other processes or next start
+        tasks = self._worker_tasks + ([self._heartbeat_task] if self._heartbeat_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._heartbeat_task = None
+        try:
+            await self.search_session_crud.release_jobs(self.owner)
+        except Exception as e:
+            print(f"Failed to release summary jobs: {e!r}")
+
+    async def submit(self, user_id: int, chat_id: int, instruction: str, language: str) -> SearchSession:
+        """Persist and enqueue job, raises asyncio.QueueFull when queue is full (job is not persisted then)"""
+        if not self._reserve(1):
+            raise asyncio.QueueFull()
+        try:
+            job = await self.search_session_crud.create_job(user_id, chat_id, instruction, language, self.owner)
+        finally:
+            self._reserved -= 1
+        self._queue.put_nowait(job)
+        return job
+
+    async def _worker(self, number: int):
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            self._waits.append((datetime.now(timezone.utc) - as_utc(job.queued_at)).total_seconds())
+            start = time.perf_counter()
+            error = None
+            try:
+                await self.search_session_crud.mark_running(job.id)
+                await self._handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Summary job {job.id} failed in worker {number}: {e!r}")
+                error = repr(e)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+            self._run_times.append(time.perf_counter() - start)
+            if error:
+                self.failed += 1
+            else:
+                self.done += 1
+            try:
+                await self.search_session_crud.mark_finished(job.id, error)
+            except Exception as e:
+                print(f"Failed to mark summary job {job.id} finished: {e}")
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        run_times = sorted(self._run_times)
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "running": self._running,
+            "done": self.done,
+            "failed": self.failed,
+            "wait_avg": mean(waits),
+            "wait_p95": percentile(waits),
+            "run_avg": mean(run_times),
+            "run_p95": percentile(run_times)
+        }
@@ -1,23 +1,140 @@
-from bot.settings import BOT_TOKEN, OPENAI_API_KEY, ASSISTANT_ID, APIFY_TOKEN
-from aiogram.fsm.storage.memory import MemoryStorage
+from bot.settings import BOT_TOKEN, OPENAI_API_KEY, ASSISTANT_ID, APIFY_TOKEN, APIFY_POSTS_BATCH_SIZE, \
+    APIFY_DATASET_PAGE_SIZE, POSTS_CACHE_TTL_MINUTES, APIFY_MAX_CONCURRENT_RUNS, SCRAPE_LEASE_TTL_SECONDS, \
+    SCRAPE_LEASE_WAIT_SECONDS, APIFY_RETRY_ATTEMPTS, APIFY_BREAKER_FAILURE_THRESHOLD, APIFY_BREAKER_RESET_SECONDS, \
+    APIFY_HEDGE_PERCENTILE, APIFY_BACKEND, APIFY_FAKE_LATENCY, APIFY_FAKE_FAILURE_RATE, APIFY_FAKE_ITEMS_PER_PROFILE, \
+    DAILY_REQUESTS_LIMIT, REQUESTS_FLUSH_INTERVAL_SECONDS, FSM_HOT_SIZE, FSM_HOT_TTL_SECONDS, \
+    FSM_FLUSH_INTERVAL_SECONDS, FSM_STATE_TTL_DAYS, SUMMARY_WORKERS, SUMMARY_QUEUE_SIZE, \
+    TELEGRAM_API_URL, LLM_BACKEND, LLM_FAKE_LATENCY, SUMMARY_MODEL, SUMMARY_CHUNK_TOKENS, SUMMARY_CONCURRENCY, \
+    OPENAI_MAX_CONCURRENCY, OPENAI_MAX_CONNECTIONS, OPENAI_TIMEOUT_SECONDS, OPENAI_POLL_INTERVAL_MS, STARTUP_WARM_UP, \
+    TOKEN_CACHE_SIZE, TOKEN_COUNT_THREAD_MIN_CHARS, SUMMARY_JOB_LEASE_SECONDS, STATS_LOG_INTERVAL_SECONDS
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.dispatcher.router import Router
-import logging
+from datetime import timedelta
 from api_integration.openai_api import ChatGPT
+from api_integration.llm_fake import FakeLLM
+from api_integration.summarizer import PostsSummarizer
 from api_integration.apify_api import ApifyService
+from api_integration.apify_fake import FakeApifyClientAsync
+from api_integration.post_cache import PostCache
 from api_integration.youtube_api import Youtube
+from bot.jobs import SummaryJobQueue
+from bot.storage import DBStorage
+from db.engine import pool_stats, warm_up_pool
 from db.facade import DB
+from utils.quota import RequestQuota
+from utils.startup import startup_report
+from utils.stats import StatsLogger
+from utils.tokens import TokenCounter
 
 
-# storage = MemoryStorage()
-bot_dp = Dispatcher()
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-gpt = ChatGPT(api_key=OPENAI_API_KEY, assistant_id=ASSISTANT_ID)
-apify_service: ApifyService = ApifyService(apify_key=APIFY_TOKEN)
+storage = DBStorage(
+    fsm_state_crud=DB.fsm_state_crud,
+    hot_size=FSM_HOT_SIZE,
+    hot_ttl=FSM_HOT_TTL_SECONDS,
+    flush_interval=FSM_FLUSH_INTERVAL_SECONDS,
+    state_ttl=timedelta(days=FSM_STATE_TTL_DAYS)
+)
+# Storage is closed (flushed) by dispatcher on shutdown, and again after summary jobs are stopped
+bot_dp = Dispatcher(storage=storage)
+# Custom Bot API server (e.g. local fake server for load tests)
+bot_session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=BOT_TOKEN, session=bot_session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+gpt = ChatGPT(
+    api_key=OPENAI_API_KEY,
+    assistant_id=ASSISTANT_ID,
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+    max_connections=OPENAI_MAX_CONNECTIONS,
+    timeout=OPENAI_TIMEOUT_SECONDS,
+    poll_interval_ms=OPENAI_POLL_INTERVAL_MS
+)
+fake_apify_client = None
+if APIFY_BACKEND == "fake":
+    fake_apify_client = FakeApifyClientAsync(
+        latency=APIFY_FAKE_LATENCY,
+        failure_rate=APIFY_FAKE_FAILURE_RATE,
+        items_per_profile=APIFY_FAKE_ITEMS_PER_PROFILE
+    )
+apify_service: ApifyService = ApifyService(
+    apify_key=APIFY_TOKEN,
+    posts_batch_size=APIFY_POSTS_BATCH_SIZE,
+    dataset_page_size=APIFY_DATASET_PAGE_SIZE,
+    max_concurrent_runs=APIFY_MAX_CONCURRENT_RUNS,
+    retry_attempts=APIFY_RETRY_ATTEMPTS,
+    breaker_failure_threshold=APIFY_BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_timeout=APIFY_BREAKER_RESET_SECONDS,
+    hedge_percentile=APIFY_HEDGE_PERCENTILE,
+    apify_client=fake_apify_client
+)
 youtube = Youtube()
 db = DB()
+post_cache = PostCache(
+    apify_service=apify_service,
+    db=db,
+    ttl_minutes=POSTS_CACHE_TTL_MINUTES,
+    lease_ttl_seconds=SCRAPE_LEASE_TTL_SECONDS,
+    lease_wait_seconds=SCRAPE_LEASE_WAIT_SECONDS
+)
+request_quota = RequestQuota(
+    user_request_crud=db.user_request_crud,
+    daily_limit=DAILY_REQUESTS_LIMIT,
+    flush_interval=REQUESTS_FLUSH_INTERVAL_SECONDS
+)
+summary_jobs = SummaryJobQueue(
+    search_session_crud=db.search_session_crud,
+    workers=SUMMARY_WORKERS,
+    max_queue_size=SUMMARY_QUEUE_SIZE,
+    lease_seconds=SUMMARY_JOB_LEASE_SECONDS
+)
+token_counter = TokenCounter(cache_size=TOKEN_CACHE_SIZE, thread_min_chars=TOKEN_COUNT_THREAD_MIN_CHARS)
+summarizer = PostsSummarizer(
+    llm=FakeLLM(latency=LLM_FAKE_LATENCY) if LLM_BACKEND == "fake" else gpt,
+    token_counter=token_counter,
+    chunk_tokens=SUMMARY_CHUNK_TOKENS,
+    concurrency=SUMMARY_CONCURRENCY,
+    model=SUMMARY_MODEL
+)
 user_router = Router()
 
+
+async def warm_up_clients():
+    """Clients are created lazily, warm-up makes first requests fast without delaying start"""
+    if not STARTUP_WARM_UP:
+        return
+    startup_report.start_warm_up({
+        "database": warm_up_pool,
+        "telegram": bot.me,
+        "openai": gpt.warm_up,
+        "tokenizer": token_counter.warm_up
+    })
+
+
+def bot_stats() -> dict:
+    """Stats of process-wide components, printed by stats_logger and served on /health in webhook mode"""
+    return {
+        "db_pool": pool_stats(),
+        "user_cache": db.user_crud.cache.stats(),
+        "fsm_storage": storage.stats(),
+        "quota": request_quota.stats(),
+        "tokens": token_counter.stats(),
+        "summary_jobs": summary_jobs.stats(),
+        "apify": apify_service.stats()
+    }
+
+
+stats_logger = StatsLogger(bot_stats, interval=STATS_LOG_INTERVAL_SECONDS)
+
 bot_dp.include_router(user_router)
+bot_dp.startup.register(request_quota.start)
+bot_dp.startup.register(warm_up_clients)
+bot_dp.startup.register(stats_logger.start)
+bot_dp.shutdown.register(stats_logger.close)
+bot_dp.shutdown.register(startup_report.stop_warm_up)
+bot_dp.shutdown.register(request_quota.close)
+bot_dp.shutdown.register(summary_jobs.close)
+# Dispatcher closes FSM storage before other shutdown hooks, state written by stopping jobs is flushed after them
+bot_dp.shutdown.register(storage.close)
+bot_dp.shutdown.register(gpt.close)
@@ -16,3 +16,72 @@ try:
 except KeyError as err:
     logging.critical(f"Can't read token from environment variable. Message: {err}")
     raise KeyError(err)
+
+# Optional settings
+APIFY_POSTS_BATCH_SIZE = int(os.environ.get('APIFY_POSTS_BATCH_SIZE', 10))
+APIFY_DATASET_PAGE_SIZE = int(os.environ.get('APIFY_DATASET_PAGE_SIZE', 100))
+POSTS_CACHE_TTL_MINUTES = int(os.environ.get('POSTS_CACHE_TTL_MINUTES', 60))
+APIFY_MAX_CONCURRENT_RUNS = int(os.environ.get('APIFY_MAX_CONCURRENT_RUNS', 100))
+SCRAPE_LEASE_TTL_SECONDS = int(os.environ.get('SCRAPE_LEASE_TTL_SECONDS', 900))
+SCRAPE_LEASE_WAIT_SECONDS = int(os.environ.get('SCRAPE_LEASE_WAIT_SECONDS', 300))
+APIFY_RETRY_ATTEMPTS = int(os.environ.get('APIFY_RETRY_ATTEMPTS', 3))
+APIFY_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('APIFY_BREAKER_FAILURE_THRESHOLD', 5))
+APIFY_BREAKER_RESET_SECONDS = int(os.environ.get('APIFY_BREAKER_RESET_SECONDS', 60))
+APIFY_HEDGE_PERCENTILE = float(os.environ.get('APIFY_HEDGE_PERCENTILE', 0))
+SUMMARY_TIME_BUDGET_SECONDS = int(os.environ.get('SUMMARY_TIME_BUDGET_SECONDS', 300))
+# "live" or "fake" (recorded datasets, without network)
+APIFY_BACKEND = os.environ.get('APIFY_BACKEND', 'live')
+APIFY_FAKE_LATENCY = float(os.environ.get('APIFY_FAKE_LATENCY', 1.0))
+APIFY_FAKE_FAILURE_RATE = float(os.environ.get('APIFY_FAKE_FAILURE_RATE', 0))
+APIFY_FAKE_ITEMS_PER_PROFILE = int(os.environ.get('APIFY_FAKE_ITEMS_PER_PROFILE', 10))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 300))
+DAILY_REQUESTS_LIMIT = int(os.environ.get('DAILY_REQUESTS_LIMIT', 10))
+REQUESTS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('REQUESTS_FLUSH_INTERVAL_SECONDS', 5))
+FSM_HOT_SIZE = int(os.environ.get('FSM_HOT_SIZE', 10000))
+FSM_HOT_TTL_SECONDS = int(os.environ.get('FSM_HOT_TTL_SECONDS', 1800))
+FSM_FLUSH_INTERVAL_SECONDS = float(os.environ.get('FSM_FLUSH_INTERVAL_SECONDS', 2))
+FSM_STATE_TTL_DAYS = int(os.environ.get('FSM_STATE_TTL_DAYS', 30))
+SUMMARY_WORKERS = int(os.environ.get('SUMMARY_WORKERS', 4))
+SUMMARY_QUEUE_SIZE = int(os.environ.get('SUMMARY_QUEUE_SIZE', 1000))
+# "polling" or "webhook", one process per bot (use supervisor.py for several processes)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+# Public base URL of webhook, if empty webhook is not registered by this process
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', 8080))
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 16))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 1000))
+# Custom Bot API server, e.g. fake server from bot/telegram_fake.py
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', '')
+# Set by supervisor for worker processes, updates of user go to shard user_id % SHARD_COUNT
+SHARD_INDEX = int(os.environ.get('SHARD_INDEX', 0))
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 1))
+SUPERVISOR_WORKERS = int(os.environ.get('SUPERVISOR_WORKERS', os.cpu_count() or 1))
+# "", "gzip" or "zstd" (requires zstandard package)
+POSTS_DOCUMENT_COMPRESSION = os.environ.get('POSTS_DOCUMENT_COMPRESSION', '')
+POSTS_DOCUMENT_MAX_BYTES = int(os.environ.get('POSTS_DOCUMENT_MAX_BYTES', 50 * 1024 * 1024))
+# "live" (OpenAI) or "fake" (api_integration/llm_fake.py, without network)
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'live')
+LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', 0.5))
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', 'gpt-4o-mini')
+SUMMARY_CHUNK_TOKENS = int(os.environ.get('SUMMARY_CHUNK_TOKENS', 3000))
+SUMMARY_CONCURRENCY = int(os.environ.get('SUMMARY_CONCURRENCY', 4))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 8))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_TIMEOUT_SECONDS', 60))
+OPENAI_POLL_INTERVAL_MS = int(os.environ.get('OPENAI_POLL_INTERVAL_MS', 500))
+# Warm up external clients (OpenAI, Telegram, DB pool, tokenizer) in background after start
+STARTUP_WARM_UP = int(os.environ.get('STARTUP_WARM_UP', 1))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 50000))
+# Token counting of batches larger than this (uncached characters) runs in a thread
+TOKEN_COUNT_THREAD_MIN_CHARS = int(os.environ.get('TOKEN_COUNT_THREAD_MIN_CHARS', 20000))
+SUMMARY_JOB_LEASE_SECONDS = int(os.environ.get('SUMMARY_JOB_LEASE_SECONDS', 60))
+# Stats of DB pool, caches, FSM storage, quota, jobs and Apify are printed this often, 0 disables
+STATS_LOG_INTERVAL_SECONDS = int(os.environ.get('STATS_LOG_INTERVAL_SECONDS', 300))
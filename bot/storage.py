@@ -0,0 +1,187 @@
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DefaultKeyBuilder, KeyBuilder
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.touched_at = time.monotonic()
+
+
+class DBStorage(BaseStorage):
+    """
+    FSM storage backed by fsm_states table with hot in-memory tier.
+    Recently used keys are kept in LRU (bounded by `hot_size`, idle keys are dropped after `hot_ttl` seconds),
+    writes are coalesced and flushed to DB every `flush_interval` seconds.
+    Keys idle for `state_ttl` are deleted from DB.
+    Hot tier is per process, so updates of a user must be handled by one process (see supervisor sharding).
+    """
+
+    def __init__(
+            self,
+            fsm_state_crud,
+            hot_size: int = 10000,
+            hot_ttl: float = 1800.0,
+            flush_interval: float = 2.0,
+            state_ttl: timedelta = timedelta(days=30),
+            key_builder: KeyBuilder = None
+        ):
+        self.fsm_state_crud = fsm_state_crud
+        self.hot_size = hot_size
+        self.hot_ttl = hot_ttl
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._hot: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: dict[str, _Record] = {}
+        self._loading: dict[str, asyncio.Task] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._last_cleanup = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+    def _remember(self, key: str, record: _Record):
+        record.touched_at = time.monotonic()
+        self._hot[key] = record
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            # Dirty records are kept in _dirty until flushed
+            self._hot.popitem(last=False)
+
+    async def _load(self, key: str) -> _Record:
+        row = await self.fsm_state_crud.get_by_key(key)
+        if row is None:
+            return _Record(None, {})
+        return _Record(row.state, row.data or {})
+
+    async def _get_record(self, key: str) -> _Record:
+        record = self._hot.get(key) or self._dirty.get(key)
+        if record is not None and time.monotonic() - record.touched_at < self.hot_ttl:
+            self.hits += 1
+            self._remember(key, record)
+            return record
+        if record is not None and key in self._dirty:
+            self._remember(key, record)
+            return record
+
+        self.misses += 1
+        # Concurrent reads of the same key share one DB query
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        loaded = await task
+
+        # Key could be written while it was loading
+        record = self._hot.get(key) or self._dirty.get(key) or loaded
+        self._remember(key, record)
+        return record
+
+    def _mark_dirty(self, key: str, record: _Record):
+        self._remember(key, record)
+        self._dirty[key] = record
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"Data must be a dict, got {type(data).__name__}")
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.data = copy.deepcopy(data)
+        self._mark_dirty(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get_record(self.key_builder.build(key))
+        return copy.deepcopy(record.data)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = datetime.now(timezone.utc)
+        records = []
+        empty_keys = []
+        for key, record in dirty.items():
+            if record.state is None and not record.data:
+                # Cleared state is not stored
+                empty_keys.append(key)
+            else:
+                records.append({"key": key, "state": record.state, "data": record.data, "updated_at": now})
+        try:
+            await self.fsm_state_crud.save_many(records)
+            await self.fsm_state_crud.delete_keys(empty_keys)
+            self.flushed += len(dirty)
+        except Exception as e:
+            print(f"Failed to flush {len(dirty)} FSM states, will retry: {e}")
+            # Newer writes made during flush win
+            self._dirty = {**dirty, **self._dirty}
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        while self._hot:
+            key, record = next(iter(self._hot.items()))
+            if now - record.touched_at < self.hot_ttl:
+                break
+            self._hot.popitem(last=False)
+
+    async def _cleanup_expired(self):
+        if time.monotonic() - self._last_cleanup < 3600:
+            return
+        self._last_cleanup = time.monotonic()
+        try:
+            deleted = await self.fsm_state_crud.delete_expired(datetime.now(timezone.utc) - self.state_ttl)
+            if deleted:
+                print(f"Deleted {deleted} expired FSM states")
+        except Exception as e:
+            print(f"Failed to delete expired FSM states: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict_idle()
+            await self._cleanup_expired()
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hot": len(self._hot),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "flushed": self.flushed
+        }
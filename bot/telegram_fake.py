@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from aiohttp import web
+
+from bot.webhook import SECRET_HEADER
+from utils.stats import mean, percentile
+
+
+class FakeTelegramServer:
+    """
+    Minimal stand-in for Telegram Bot API, for load tests of webhook mode without network.
+    Bot methods are answered with plausible results and recorded, updates are posted to bot webhook.
+    Run bot with TELEGRAM_API_URL=http://<host>:<port> to use it.
+    """
+    BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self.sent_messages: list[tuple[int, float]] = []  # (chat_id, time)
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **fields
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        result = True
+        if method == "getMe":
+            result = self.BOT_USER
+        elif method == "getUpdates":
+            result = []
+        elif method in ("sendMessage", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            self.sent_messages.append((chat_id, time.perf_counter()))
+            if method == "sendMessage":
+                result = self._message(chat_id, text=params.get("text", ""))
+            else:
+                result = self._message(chat_id, document={"file_id": "fake", "file_unique_id": "fake"})
+        return web.json_response({"ok": True, "result": result})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    def make_update(self, user_id: int, text: str) -> dict:
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "language_code": "en"}
+        return {
+            "update_id": next(self._update_ids),
+            "message": {**self._message(user_id, text=text), "from": user}
+        }
+
+    async def post_updates(self, webhook_url: str, secret: str, users: int, text: str) -> list[int]:
+        """Post one message update per user concurrently, returns webhook response statuses"""
+        headers = {SECRET_HEADER: secret} if secret else {}
+        async with aiohttp.ClientSession() as session:
+            async def post(user_id: int) -> int:
+                async with session.post(webhook_url, json=self.make_update(user_id, text), headers=headers) as response:
+                    return response.status
+            return await asyncio.gather(*[post(user_id) for user_id in range(1, users + 1)])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server and webhook load generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--users", type=int, default=100, help="Users sending one message each")
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--wait", type=float, default=10.0, help="Seconds to wait for bot answers")
+    args = parser.parse_args()
+
+    server = FakeTelegramServer()
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Telegram API on http://{args.host}:{args.port}")
+
+    start = time.perf_counter()
+    statuses = await server.post_updates(args.webhook_url, args.secret, args.users, args.text)
+    print(f"Posted {len(statuses)} updates in {time.perf_counter() - start:.2f}s, statuses: "
+          f"{ {status: statuses.count(status) for status in set(statuses)} }")
+
+    await asyncio.sleep(args.wait)
+    first_answers = {}
+    for chat_id, answered_at in server.sent_messages:
+        first_answers.setdefault(chat_id, answered_at - start)
+    latencies = sorted(first_answers.values())
+    if latencies:
+        print(f"Answered {len(latencies)} users, first answer latency avg {mean(latencies):.3f}s, "
+              f"p95 {percentile(latencies):.3f}s")
+    print(f"Bot API calls: {server.calls}")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+import asyncio
+import hmac
+import time
+from collections import deque
+from typing import Callable
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+
+from utils.stats import mean, percentile
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates on aiohttp server and processes them with a pool of `workers`.
+    Updates are answered right after they are queued. When queue is full, Telegram gets 503 and retries later.
+    FSM storage and quota of the bot are per process, so all updates of a user must come to one server
+    (single process or a shard of supervisor.py).
+    """
+    SHUTDOWN_TIMEOUT = 30
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            path: str = "/webhook",
+            secret: str = "",
+            workers: int = 16,
+            max_queue_size: int = 1000,
+            stats_window: int = 1000,
+            stats_provider: Callable[[], dict] = None
+        ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.workers = max(1, workers)
+        # Stats of other components of the bot, served on /health with stats of the server
+        self.stats_provider = stats_provider
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._worker_tasks: list[asyncio.Task] = []
+        self._latencies = deque(maxlen=stats_window)
+        self.received = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def _verify_secret(self, request: web.Request) -> bool:
+        if not self.secret:
+            return True
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._verify_secret(request):
+            return web.Response(status=401, text="Unauthorized")
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            print(f"Failed to parse update: {e}")
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait((update, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        if self.stats_provider is None:
+            return web.json_response(self.stats())
+        return web.json_response({"webhook": self.stats(), **self.stats_provider()})
+
+    async def _worker(self):
+        while True:
+            update, received_at = await self._queue.get()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                print(f"Failed to process update {update.update_id}: {e!r}")
+            finally:
+                self._latencies.append(time.perf_counter() - received_at)
+                self._queue.task_done()
+
+    async def _on_startup(self, app: web.Application):
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _on_shutdown(self, app: web.Application):
+        # Server doesn't accept updates anymore, process already accepted ones
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"{self._queue.qsize()} accepted updates were not processed before shutdown")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get("/health", self.health)
+        app.on_startup.append(self._on_startup)
+        # Workers are stopped before dispatcher shutdown hooks flush storage and quota
+        app.on_shutdown.append(self._on_shutdown)
+        # Dispatcher startup/shutdown hooks are run by aiohttp app
+        setup_application(app, self.dispatcher, bot=self.bot)
+        return app
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "received": self.received,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency_avg": mean(latencies),
+            "latency_p95": percentile(latencies)
+        }
@@ -1,16 +1,65 @@
 import asyncio
+import hashlib
+from datetime import datetime, timezone
+from sqlalchemy import delete, inspect, insert, select
+from sqlalchemy.schema import CreateIndex, CreateTable
 from db.engine import engine, Base
+from db.migrations import SchemaMismatchError, migrate, schema_problems
 from db.models.user import User, UserRequest  # don`t remove this import
 from db.models.profile import Profile
 from db.models.search_session import SearchSession
 from db.models.search_algorithm import SearchAlgorithm
 from db.models.summary import Summary
 from db.models.post import Post
+from db.models.friend import Friend
+from db.models.scrape_lease import ScrapeLease
+from db.models.fsm_state import FSMState
+from db.models.schema_version import SchemaVersion
 
-async def create_tables():
+
+def schema_version() -> str:
+    """Hash of DDL of all tables and indexes, changes with any model change"""
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=engine.dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=engine.dialect)).encode())
+    return digest.hexdigest()
+
+
+def _stored_version(conn) -> str | None:
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+
+
+def _create_all(conn, version: str):
+    Base.metadata.create_all(conn)
+    migrate(conn)
+    # Version is recorded only for schema which matches models
+    problems = schema_problems(conn)
+    if problems:
+        raise SchemaMismatchError(
+            "Database schema doesn't match models, add a migration to db/migrations.py:\n  " + "\n  ".join(problems)
+        )
+    conn.execute(delete(SchemaVersion))
+    conn.execute(insert(SchemaVersion).values(id=1, version=version, updated_at=datetime.now(timezone.utc)))
+
+
+async def create_tables(force: bool = False) -> bool:
+    """
+    Create missing tables and migrate existing ones (db/migrations.py). Skipped when stored schema version
+    matches models (unless `force`), returns True if tables were created.
+    Raises SchemaMismatchError, without recording the version, if schema still differs from models after migrations.
+    """
+    version = schema_version()
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        if not force and await conn.run_sync(_stored_version) == version:
+            return False
+        await conn.run_sync(_create_all, version)
+    print(f"Tables created, schema version: {version[:12]}")
+    return True
 
 
 if __name__ == "__main__":
-    asyncio.run(create_tables())
+    asyncio.run(create_tables(force=True))
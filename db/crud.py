@@ -1,11 +1,14 @@
 from sqlalchemy.future import select
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.dialects import postgresql, sqlite, mysql
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 from db.session import Sessions
 
 
 class AsyncCRUD:
+    BULK_CHUNK_SIZE = 500
+
     def __init__(self, model):
         self.model = model
 
@@ -15,6 +18,61 @@ class AsyncCRUD:
         async for session in Sessions.get_session():
             yield session
 
+    def _insert_ignore(self, dialect_name: str):
+        """INSERT statement which skips rows conflicting by unique constraints, in syntax of DB dialect"""
+        if dialect_name == "sqlite":
+            return sqlite.insert(self.model).on_conflict_do_nothing()
+        if dialect_name == "postgresql":
+            return postgresql.insert(self.model).on_conflict_do_nothing()
+        if dialect_name in ("mysql", "mariadb"):
+            return mysql.insert(self.model).prefix_with("IGNORE")
+        raise NotImplementedError(f"Bulk insert ignoring conflicts is not supported for {dialect_name}")
+
+    async def bulk_insert_ignore(self, rows: list[dict], chunk_size: int = None) -> int:
+        """
+        Insert rows with one statement per chunk, rows which already exist (by unique constraints) are skipped.
+        Returns number of inserted rows.
+        """
+        if not rows:
+            return 0
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        async with self._get_session() as session:
+            statement = self._insert_ignore(session.bind.dialect.name)
+            inserted = 0
+            for i in range(0, len(rows), chunk_size):
+                result = await session.execute(statement.values(rows[i:i + chunk_size]))
+                inserted += max(result.rowcount, 0)
+            await session.commit()
+            return inserted
+
+    def _upsert(self, dialect_name: str, conflict_columns: list[str], update_columns: list[str]):
+        """INSERT statement which updates `update_columns` of rows conflicting by `conflict_columns`"""
+        if dialect_name in ("sqlite", "postgresql"):
+            dialect = sqlite if dialect_name == "sqlite" else postgresql
+            statement = dialect.insert(self.model)
+            return statement.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={column: statement.excluded[column] for column in update_columns}
+            )
+        if dialect_name in ("mysql", "mariadb"):
+            statement = mysql.insert(self.model)
+            return statement.on_duplicate_key_update({column: statement.inserted[column] for column in update_columns})
+        raise NotImplementedError(f"Bulk upsert is not supported for {dialect_name}")
+
+    async def bulk_upsert(self, rows: list[dict], conflict_columns: list[str], chunk_size: int = None):
+        """
+        Insert rows or update existing ones (by `conflict_columns`), with one statement per chunk of rows
+        """
+        if not rows:
+            return
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        update_columns = [column for column in rows[0] if column not in conflict_columns]
+        async with self._get_session() as session:
+            statement = self._upsert(session.bind.dialect.name, conflict_columns, update_columns)
+            for i in range(0, len(rows), chunk_size):
+                await session.execute(statement.values(rows[i:i + chunk_size]))
+            await session.commit()
+
     async def create(self, **kwargs):
         async with self._get_session() as session:
             instance = self.model(**kwargs)
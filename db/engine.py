@@ -1,13 +1,71 @@
 import logging
-from bot.settings import DATABASE_URL
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from bot.settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from db.pool import MeteredQueuePool
 
 
 Base = declarative_base()
-engine = create_async_engine(DATABASE_URL, echo=False)
 
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",  # 20 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=134217728"  # 128 MB
+)
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _create_engine():
+    url = make_url(DATABASE_URL)
+    if _is_memory_sqlite(url):
+        # In-memory DB lives in a single connection, it can't be pooled
+        return create_async_engine(url, echo=False)
+
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=MeteredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+
+engine = _create_engine()
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+# One session factory for all CRUD classes
+async_session = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    if isinstance(pool, MeteredQueuePool):
+        return pool.stats()
+    return {"status": pool.status()}
+
+
+async def warm_up_pool():
+    """Open first pooled connection before first request (connect, SQLite pragmas, pre-ping)"""
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
 
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
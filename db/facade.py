@@ -2,9 +2,19 @@ import asyncio
 from db.models.user import UserCRUD, UserRequestCRUD
 from db.models.profile import ProfileCRUD
 from db.models.friend import FriendCRUD
+from db.models.post import PostCRUD
+from db.models.scrape_lease import ScrapeLeaseCRUD
+from db.models.fsm_state import FSMStateCRUD
+from db.models.search_session import SearchSessionCRUD
+from db.models.summary import SummaryCRUD
 
 class DB:
     user_crud = UserCRUD()
     user_request_crud = UserRequestCRUD()
     profile_crud = ProfileCRUD()
     friend_crud = FriendCRUD()
+    post_crud = PostCRUD()
+    scrape_lease_crud = ScrapeLeaseCRUD()
+    fsm_state_crud = FSMStateCRUD()
+    search_session_crud = SearchSessionCRUD()
+    summary_crud = SummaryCRUD()
@@ -0,0 +1,97 @@
+"""
+Migrations of existing databases. create_all only creates missing tables, so columns, nullability
+and indexes changed in tables of an existing DB are applied here. Every step compares the table in DB with its model,
+so steps can be run on any version of the schema.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+from db.engine import Base
+
+# Tables changed after they were created in deployed DBs, in order of changes.
+# `fill` maps new NOT NULL columns to SQL expressions giving their values in existing rows.
+MIGRATIONS: list[tuple[str, dict[str, str]]] = [
+    ("user_requests", {}),  # index on (user_id, timestamp)
+    ("profiles", {}),  # last_post_timestamp, last_post_url
+    ("posts", {}),  # like_count, reply_count, retweet_count, view_count
+    # Summary jobs: job columns, profile/algorithm/start are not known for queued jobs.
+    # Sessions of earlier versions were finished searches
+    ("search_sessions", {"status": "'done'", "queued_at": "COALESCE(started_at, CURRENT_TIMESTAMP)"}),
+]
+
+
+class SchemaMismatchError(RuntimeError):
+    pass
+
+
+def _column_ddl(conn, column) -> str:
+    return f"{column.name} {column.type.compile(dialect=conn.dialect)}"
+
+
+def _rebuild_sqlite_table(conn, table, fill: dict[str, str]):
+    """SQLite can't alter columns: copy rows into a new table with model schema and swap it in"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    new_name = f"{table.name}_migrated"
+    conn.execute(text(
+        str(CreateTable(table).compile(dialect=conn.dialect)).replace(
+            f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1
+        )
+    ))
+    columns = [column.name for column in table.columns if column.name in existing or column.name in fill]
+    values = [name if name in existing else fill[name] for name in columns]
+    conn.execute(text(
+        f"INSERT INTO {new_name} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {table.name}"
+    ))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {new_name} RENAME TO {table.name}"))
+
+
+def _migrate_table(conn, table, fill: dict[str, str]):
+    columns = {column["name"]: column for column in inspect(conn).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in columns]
+    relaxed = [
+        column for column in table.columns
+        if column.name in columns and column.nullable and not columns[column.name]["nullable"]
+    ]
+    if conn.dialect.name == "sqlite" and (relaxed or any(not column.nullable for column in missing)):
+        _rebuild_sqlite_table(conn, table, fill)
+    else:
+        for column in missing:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(conn, column)}"))
+            if column.name in fill:
+                conn.execute(text(f"UPDATE {table.name} SET {column.name} = {fill[column.name]}"))
+            if not column.nullable:
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} SET NOT NULL"))
+        for column in relaxed:
+            conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL"))
+
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def migrate(conn):
+    """Bring tables of existing DB to their models, tables which don't exist yet are left to create_all"""
+    inspector = inspect(conn)
+    for table_name, fill in MIGRATIONS:
+        if inspector.has_table(table_name):
+            _migrate_table(conn, Base.metadata.tables[table_name], fill)
+
+
+def schema_problems(conn) -> list[str]:
+    """Differences of tables in DB from models: missing columns and indexes, NOT NULL mismatches"""
+    inspector = inspect(conn)
+    problems = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"table {table.name} is missing")
+            continue
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f"column {table.name}.{column.name} is missing")
+            elif not column.primary_key and columns[column.name]["nullable"] != column.nullable:
+                problems.append(f"column {table.name}.{column.name} must be {'' if column.nullable else 'NOT '}NULL")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                problems.append(f"index {index.name} is missing")
+    return problems
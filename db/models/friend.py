@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
 from db.crud import AsyncCRUD
 from db.engine import Base
+from db.models.profile import Profile
 from sqlalchemy import select
 
 
@@ -32,21 +33,35 @@ class FriendCRUD(AsyncCRUD):
     #         await session.commit()
 
     async def add_friends(self, profile_id, friend_ids):
-        async with self._get_session() as session:
-            for friend_id in friend_ids:
-                if profile_id == friend_id:
-                    continue  # Missed adding self
-                exists = await session.execute(
-                    select(Friend).where(
-                        Friend.profile_id == profile_id,
-                        Friend.friend_profile_id == friend_id
-                    )
-                )
-                if not exists.scalars().first():
-                    session.add(Friend(profile_id=profile_id, friend_profile_id=friend_id))
-            await session.commit()
+        await self.bulk_insert_ignore([
+            {"profile_id": profile_id, "friend_profile_id": friend_id}
+            for friend_id in dict.fromkeys(friend_ids)
+            if friend_id != profile_id  # Missed adding self
+        ])
 
     async def get_friends(self, profile_id):
         async with self._get_session() as session:
             result = await session.execute(select(Friend.friend_profile_id).where(Friend.profile_id == profile_id))
             return [r[0] for r in result.all()]
+
+    async def get_following_profiles(self, profile_id: int) -> list[Profile]:
+        """Profiles followed by profile, in one joined query"""
+        result = await self.get_following_profiles_many([profile_id])
+        return result[profile_id]
+
+    async def get_following_profiles_many(self, profile_ids: list[int]) -> dict[int, list[Profile]]:
+        """Profiles followed by each of given profiles, in one joined query"""
+        results = {profile_id: [] for profile_id in profile_ids}
+        if not profile_ids:
+            return results
+
+        async with self._get_session() as session:
+            result = await session.execute(
+                select(Friend.profile_id, Profile)
+                .join(Profile, Profile.id == Friend.friend_profile_id)
+                .where(Friend.profile_id.in_(profile_ids))
+                .order_by(Friend.id)
+            )
+            for profile_id, profile in result.all():
+                results[profile_id].append(profile)
+        return results
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, String, DateTime, JSON, delete
+from datetime import datetime, timezone
+from db.crud import AsyncCRUD
+from db.engine import Base
+
+
+class FSMState(Base):
+    __tablename__ = "fsm_states"
+
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(JSON, nullable=False, default=dict)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+
+
+class FSMStateCRUD(AsyncCRUD):
+    def __init__(self):
+        super().__init__(FSMState)
+
+    async def get_by_key(self, key: str) -> FSMState | None:
+        async with self._get_session() as session:
+            return await session.get(FSMState, key)
+
+    async def save_many(self, records: list[dict]):
+        """Insert or replace records ({"key", "state", "data", "updated_at"})"""
+        await self.bulk_upsert(records, conflict_columns=["key"])
+
+    async def delete_keys(self, keys: list[str]):
+        if not keys:
+            return
+        async with self._get_session() as session:
+            for i in range(0, len(keys), self.BULK_CHUNK_SIZE):
+                await session.execute(delete(FSMState).where(FSMState.key.in_(keys[i:i + self.BULK_CHUNK_SIZE])))
+            await session.commit()
+
+    async def delete_expired(self, before: datetime) -> int:
+        async with self._get_session() as session:
+            result = await session.execute(delete(FSMState).where(FSMState.updated_at < before))
+            await session.commit()
+            return result.rowcount
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, select
 from datetime import datetime, timezone, timedelta
+from api_integration.records import PostRecord, MISSING
 from db.engine import Base
 from db.crud import AsyncCRUD
 
@@ -13,6 +14,15 @@ class Post(Base):
     post_url = Column(String, nullable=False)
     timestamp = Column(DateTime, nullable=False, index=True)
     retrieved_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    like_count = Column(Integer, nullable=True)
+    reply_count = Column(Integer, nullable=True)
+    retweet_count = Column(Integer, nullable=True)
+    view_count = Column(Integer, nullable=True)
+
+
+def _metric_or_none(value: int):
+    """Metrics missing in actor result are stored as NULL"""
+    return None if value == MISSING else value
 
 
 class PostCRUD(AsyncCRUD):
@@ -20,10 +30,37 @@ class PostCRUD(AsyncCRUD):
         super().__init__(Post)
 
     async def add_posts(self, profile_id, posts):
+        await self.add_posts_bulk({profile_id: posts})
+
+    async def add_posts_bulk(self, posts_by_profile: dict[int, list[PostRecord]]):
+        """
+        Save posts for several profiles in one session, posts already stored (by url) are skipped
+        """
+        urls = [post.url for posts in posts_by_profile.values() for post in posts]
+        if not urls:
+            return
+
         async with self._get_session() as session:
-            for post in posts:
-                post_obj = Post(profile_id=profile_id, content=post['content'], post_url=post['url'], timestamp=post['timestamp'])
-                session.add(post_obj)
+            result = await session.execute(
+                select(Post.post_url).where(Post.profile_id.in_(posts_by_profile.keys()), Post.post_url.in_(urls))
+            )
+            existing_urls = {r[0] for r in result.all()}
+
+            for profile_id, posts in posts_by_profile.items():
+                for post in posts:
+                    if post.url in existing_urls:
+                        continue
+                    existing_urls.add(post.url)
+                    session.add(Post(
+                        profile_id=profile_id,
+                        content=post.content,
+                        post_url=post.url,
+                        timestamp=post.timestamp,
+                        like_count=_metric_or_none(post.like_count),
+                        reply_count=_metric_or_none(post.reply_count),
+                        retweet_count=_metric_or_none(post.retweet_count),
+                        view_count=_metric_or_none(post.view_count)
+                    ))
             await session.commit()
 
     async def get_recent_posts(self, profile_id, since_hours):
@@ -1,6 +1,7 @@
 from sqlalchemy import (
-    Column, Integer, String, select, DateTime, func
+    Column, Integer, String, select, update, DateTime, func, bindparam
 )
+from api_integration.records import FollowingRecord
 from db.crud import AsyncCRUD
 from db.engine import Base
 from datetime import datetime, timezone
@@ -15,6 +16,8 @@ class Profile(Base):
     twitter_id = Column(Integer, nullable=False)
     followers_count = Column(Integer, nullable=True)
     last_checked = Column(DateTime, nullable=True)
+    last_post_timestamp = Column(DateTime, nullable=True)
+    last_post_url = Column(String, nullable=True)
 
 
 class ProfileCRUD(AsyncCRUD):
@@ -56,7 +59,7 @@ class ProfileCRUD(AsyncCRUD):
         async with self._get_session() as session:
             profile = await session.get(Profile, profile_id)
             if profile:
-                profile.last_checked_at = datetime.now(timezone.utc)
+                profile.last_checked = datetime.now(timezone.utc)
                 await session.commit()
                 await session.refresh(profile)
                 return profile
@@ -66,27 +69,62 @@ class ProfileCRUD(AsyncCRUD):
             result = await session.execute(select(Profile).where(Profile.username == username))
             return result.scalars().first()
 
-    async def bulk_save_profiles(self, profiles: list[dict]) -> list[int]:
+    async def get_by_usernames(self, usernames: list[str]) -> dict[str, Profile]:
         async with self._get_session() as session:
-            # Get already existing username
-            usernames = [p["username"] for p in profiles]
             result = await session.execute(select(Profile).where(Profile.username.in_(usernames)))
-            existing_profiles = {p.username: p.id for p in result.scalars().all()}
+            return {p.username: p for p in result.scalars().all()}
 
-            new_profiles = []
-            for profile in profiles:
-                if profile["username"] not in existing_profiles:
-                    new_profiles.append(Profile(
-                        username=profile["username"],
-                        full_name=profile.get("full_name"),
-                        twitter_id=profile["twitter_id"]
-                    ))
+    async def mark_checked(self, profile_ids: list[int], profile_values: dict[int, dict] = None):
+        """
+        Set last_checked for several profiles, and update other values (followers count,
+        newest post mark) if they are known
+        """
+        if not profile_ids:
+            return
 
-            if new_profiles:
-                session.add_all(new_profiles)
-                await session.commit()
+        profile_values = profile_values or {}
+        now = datetime.now(timezone.utc)
+        # One executemany statement, unknown values keep what is stored
+        statement = update(Profile.__table__).where(Profile.id == bindparam("b_id")).values(
+            last_checked=now,
+            followers_count=func.coalesce(
+                bindparam("b_followers_count", type_=Integer), Profile.followers_count
+            ),
+            last_post_timestamp=func.coalesce(
+                bindparam("b_last_post_timestamp", type_=DateTime), Profile.last_post_timestamp
+            ),
+            last_post_url=func.coalesce(bindparam("b_last_post_url", type_=String), Profile.last_post_url)
+        )
+        rows = []
+        for profile_id in profile_ids:
+            values = profile_values.get(profile_id) or {}
+            rows.append({
+                "b_id": profile_id,
+                "b_followers_count": values.get("followers_count"),
+                "b_last_post_timestamp": values.get("last_post_timestamp"),
+                "b_last_post_url": values.get("last_post_url")
+            })
+        async with self._get_session() as session:
+            await session.execute(statement, rows)
+            await session.commit()
 
-            # Get all again — including just added
-            result = await session.execute(select(Profile).where(Profile.username.in_(usernames)))
-            all_profiles = {p.username: p.id for p in result.scalars().all()}
-            return [all_profiles[p["username"]] for p in profiles]
+    async def bulk_save_profiles(self, profiles: list[FollowingRecord]) -> list[int]:
+        """
+        Save profiles which are not in DB yet, returns ids of all given profiles in the same order
+        """
+        await self.bulk_insert_ignore([
+            {"username": p.username, "full_name": p.full_name, "twitter_id": p.twitter_id}
+            for p in profiles
+        ])
+
+        usernames = list(dict.fromkeys(p.username for p in profiles))
+        all_profiles = {}
+        async with self._get_session() as session:
+            for i in range(0, len(usernames), self.BULK_CHUNK_SIZE):
+                result = await session.execute(
+                    select(Profile.username, Profile.id).where(
+                        Profile.username.in_(usernames[i:i + self.BULK_CHUNK_SIZE])
+                    )
+                )
+                all_profiles.update({username: profile_id for username, profile_id in result.all()})
+        return [all_profiles[p.username] for p in profiles]
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from db.engine import Base
+from datetime import datetime, timezone
+
+
+class SchemaVersion(Base):
+    """Single row with hash of models schema, create_tables is skipped while it matches"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
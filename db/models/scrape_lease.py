@@ -0,0 +1,124 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import (
+    Column, Integer, String, select, update, delete, or_, ForeignKey, DateTime, UniqueConstraint
+)
+from db.crud import AsyncCRUD
+from db.engine import Base
+
+
+class ScrapeLease(Base):
+    __tablename__ = "scrape_leases"
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey("profiles.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "posts" or "followings"
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("profile_id", "kind"),)
+
+
+class ScrapeLeaseCRUD(AsyncCRUD):
+    """
+    Leases let only one scrape of (profile, kind) run at a time, other scrapes wait for its result.
+    Every acquisition has its own owner token (see new_owner), so coroutines of one process don't share leases.
+    Lease expires after ttl, so a crashed process doesn't block scraping forever.
+    """
+    PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+
+    def __init__(self):
+        super().__init__(ScrapeLease)
+
+    @classmethod
+    def new_owner(cls) -> str:
+        return f"{cls.PROCESS}:{uuid.uuid4().hex}"
+
+    async def try_acquire(self, profile_id: int, kind: str, ttl_seconds: int, owner: str) -> bool:
+        return profile_id in await self.acquire_many([profile_id], kind, ttl_seconds, owner)
+
+    async def acquire_many(self, profile_ids: list[int], kind: str, ttl_seconds: int, owner: str) -> set[int]:
+        """
+        Lease profiles which are free, expired or already leased by `owner`, returns ids leased by `owner`.
+        Takes three statements for any number of profiles: take over expired leases, insert missing ones, read result.
+        """
+        if not profile_ids:
+            return set()
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        async with self._get_session() as session:
+            await session.execute(
+                update(ScrapeLease)
+                .where(
+                    ScrapeLease.profile_id.in_(profile_ids),
+                    ScrapeLease.kind == kind,
+                    or_(ScrapeLease.expires_at < now, ScrapeLease.owner == owner)
+                )
+                .values(owner=owner, expires_at=expires_at)
+            )
+            await session.commit()
+
+        # Leases held by others are kept by unique constraint
+        await self.bulk_insert_ignore([
+            {"profile_id": profile_id, "kind": kind, "owner": owner, "expires_at": expires_at}
+            for profile_id in set(profile_ids)
+        ])
+
+        async with self._get_session() as session:
+            result = await session.execute(
+                select(ScrapeLease.profile_id).where(
+                    ScrapeLease.profile_id.in_(profile_ids),
+                    ScrapeLease.kind == kind,
+                    ScrapeLease.owner == owner
+                )
+            )
+            return {r[0] for r in result.all()}
+
+    async def release_many(self, profile_ids: list[int], kind: str, owner: str):
+        if not profile_ids:
+            return
+        async with self._get_session() as session:
+            await session.execute(
+                delete(ScrapeLease).where(
+                    ScrapeLease.profile_id.in_(profile_ids),
+                    ScrapeLease.kind == kind,
+                    ScrapeLease.owner == owner
+                )
+            )
+            await session.commit()
+
+    async def get_held(self, profile_ids: list[int], kind: str, owner: str = None) -> set[int]:
+        """Returns ids of profiles with active lease of other owners (including other coroutines of this process)"""
+        async with self._get_session() as session:
+            query = select(ScrapeLease.profile_id).where(
+                ScrapeLease.profile_id.in_(profile_ids),
+                ScrapeLease.kind == kind,
+                ScrapeLease.expires_at >= datetime.now(timezone.utc)
+            )
+            if owner is not None:
+                query = query.where(ScrapeLease.owner != owner)
+            result = await session.execute(query)
+            return {r[0] for r in result.all()}
+
+    async def wait_released(
+            self,
+            profile_ids: list[int],
+            kind: str,
+            timeout: float,
+            owner: str = None,
+            poll_interval: float = 2.0
+        ) -> set[int]:
+        """
+        Wait until leases of other owners are released or expired.
+        Returns ids of profiles which are still held after timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        held = await self.get_held(profile_ids, kind, owner)
+        while held and loop.time() < deadline:
+            await asyncio.sleep(min(poll_interval, max(0.0, deadline - loop.time())))
+            held = await self.get_held(list(held), kind, owner)
+        return held
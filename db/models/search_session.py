@@ -1,20 +1,37 @@
 from sqlalchemy import (
-    Column, Integer, select, ForeignKey, DateTime, func
+    Column, Integer, String, Text, select, update, ForeignKey, DateTime, or_
 )
 from db.crud import AsyncCRUD
 from db.engine import Base
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 
 class SearchSession(Base):
+    """
+    Search session is also a summary job, processed by SummaryJobQueue.
+    Unfinished job belongs to `owner` (job queue of one process) while its heartbeat is fresh.
+    """
     __tablename__ = "search_sessions"
 
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    profile_id = Column(Integer, ForeignKey("profiles.id"), nullable=False)
-    algorithm_id = Column(Integer, ForeignKey("search_algorithms.id"), nullable=False)
-    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    profile_id = Column(Integer, ForeignKey("profiles.id"), nullable=True)
+    algorithm_id = Column(Integer, ForeignKey("search_algorithms.id"), nullable=True)
+    started_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
+    status = Column(String, default=STATUS_QUEUED, nullable=False, index=True)
+    instruction = Column(String, nullable=True)
+    chat_id = Column(Integer, nullable=True)
+    language = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    queued_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
 
 
 class SearchSessionCRUD(AsyncCRUD):
@@ -35,3 +52,104 @@ class SearchSessionCRUD(AsyncCRUD):
         async with self._get_session() as session:
             result = await session.execute(select(SearchSession).where(SearchSession.user_id == user_id))
             return result.scalars().all()
+
+    async def create_job(self, user_id: int, chat_id: int, instruction: str, language: str, owner: str) -> SearchSession:
+        return await self.create(
+            user_id=user_id,
+            chat_id=chat_id,
+            instruction=instruction,
+            language=language,
+            status=SearchSession.STATUS_QUEUED,
+            owner=owner,
+            heartbeat_at=datetime.now(timezone.utc)
+        )
+
+    async def mark_running(self, job_id: int):
+        async with self._get_session() as session:
+            await session.execute(
+                update(SearchSession).where(SearchSession.id == job_id).values(
+                    status=SearchSession.STATUS_RUNNING,
+                    started_at=datetime.now(timezone.utc)
+                )
+            )
+            await session.commit()
+
+    async def mark_finished(self, job_id: int, error: str = None):
+        async with self._get_session() as session:
+            await session.execute(
+                update(SearchSession).where(SearchSession.id == job_id).values(
+                    status=SearchSession.STATUS_FAILED if error else SearchSession.STATUS_DONE,
+                    finished_at=datetime.now(timezone.utc),
+                    error=error
+                )
+            )
+            await session.commit()
+
+    @staticmethod
+    def _claimable(owner: str, now: datetime, lease_seconds: float):
+        """Unfinished jobs of other owners without live owner: released or owner stopped heartbeating"""
+        return (
+            SearchSession.status.in_([SearchSession.STATUS_QUEUED, SearchSession.STATUS_RUNNING]),
+            or_(SearchSession.owner.is_(None), SearchSession.heartbeat_at < now - timedelta(seconds=lease_seconds)),
+            or_(SearchSession.owner.is_(None), SearchSession.owner != owner)
+        )
+
+    async def claim_unfinished_jobs(
+            self,
+            owner: str,
+            lease_seconds: float,
+            limit: int,
+            shard_index: int = 0,
+            shard_count: int = 1
+        ) -> list[SearchSession]:
+        """
+        Claim queued jobs and jobs of stopped or crashed processes for users of the shard, in order of creation.
+        Claim is a conditional UPDATE, so a job is taken by one process only. Returns jobs owned by `owner`.
+        """
+        now = datetime.now(timezone.utc)
+        async with self._get_session() as session:
+            query = select(SearchSession.id).where(*self._claimable(owner, now, lease_seconds))
+            if shard_count > 1:
+                query = query.where(SearchSession.user_id % shard_count == shard_index)
+            job_ids = (await session.execute(query.order_by(SearchSession.id).limit(limit))).scalars().all()
+            if not job_ids:
+                return []
+
+            await session.execute(
+                update(SearchSession)
+                .where(SearchSession.id.in_(job_ids), *self._claimable(owner, now, lease_seconds))
+                .values(owner=owner, heartbeat_at=now)
+            )
+            await session.commit()
+            result = await session.execute(
+                select(SearchSession)
+                .where(SearchSession.id.in_(job_ids), SearchSession.owner == owner)
+                .order_by(SearchSession.id)
+            )
+            return result.scalars().all()
+
+    async def release_jobs(self, owner: str):
+        """Unfinished jobs of stopped queue can be claimed by other processes right away"""
+        async with self._get_session() as session:
+            await session.execute(
+                update(SearchSession)
+                .where(
+                    SearchSession.owner == owner,
+                    SearchSession.status.in_([SearchSession.STATUS_QUEUED, SearchSession.STATUS_RUNNING])
+                )
+                .values(owner=None, heartbeat_at=None)
+            )
+            await session.commit()
+
+    async def heartbeat(self, owner: str):
+        """Prolong ownership of all unfinished jobs of `owner` with one statement"""
+        async with self._get_session() as session:
+            await session.execute(
+                update(SearchSession)
+                .where(
+                    SearchSession.owner == owner,
+                    SearchSession.status.in_([SearchSession.STATUS_QUEUED, SearchSession.STATUS_RUNNING])
+                )
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+            await session.commit()
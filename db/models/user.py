@@ -1,8 +1,10 @@
 from sqlalchemy import (
-    Column, Integer, String, select, ForeignKey, Boolean, DateTime, func
+    Column, Integer, String, select, insert, ForeignKey, Boolean, DateTime, Index, func
 )
 from db.crud import AsyncCRUD
 from db.engine import Base
+from bot.settings import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+from utils.cache import TTLCache
 from datetime import datetime, timezone, date
 
 
@@ -26,10 +28,41 @@ class UserRequest(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
+    __table_args__ = (Index("ix_user_requests_user_id_timestamp", "user_id", "timestamp"),)
+
 
 class UserCRUD(AsyncCRUD):
     def __init__(self):
         super().__init__(User)
+        # Users are read by registration filters on every update, not found users are cached too
+        self.cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+    async def read(self, id_):
+        found, user = self.cache.get(id_)
+        if found:
+            return user
+        generation = self.cache.generation
+        user = await super().read(id_)
+        self.cache.set(id_, user, generation)
+        return user
+
+    async def create(self, **kwargs):
+        try:
+            return await super().create(**kwargs)
+        finally:
+            self.cache.invalidate(kwargs.get("id"))
+
+    async def update(self, id_, **kwargs):
+        try:
+            return await super().update(id_, **kwargs)
+        finally:
+            self.cache.invalidate(id_)
+
+    async def delete(self, id_):
+        try:
+            return await super().delete(id_)
+        finally:
+            self.cache.invalidate(id_)
 
     async def get_admin(self):
         async with self._get_session() as session:
@@ -48,6 +81,7 @@ class UserCRUD(AsyncCRUD):
                     user.is_on_work_shift = value
                 await session.commit()
                 await session.refresh(user)
+                self.cache.invalidate(user_id)
                 return user
             return
 
@@ -68,6 +102,14 @@ class UserRequestCRUD(AsyncCRUD):
             await session.commit()
             await session.refresh(request)
             return request
+
+    async def add_requests_bulk(self, requests: list[dict]):
+        """Insert many requests ({"user_id", "timestamp"}) in one statement"""
+        if not requests:
+            return
+        async with self._get_session() as session:
+            await session.execute(insert(UserRequest), requests)
+            await session.commit()
     
     async def get_requests_count(self, user_id: int) -> int:
         async with self._get_session() as session:
@@ -0,0 +1,56 @@
+import time
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from utils.stats import percentile
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool which records how long connection checkouts wait for a free connection
+    """
+    WAITS_WINDOW = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits = deque(maxlen=self.WAITS_WINDOW)
+
+    def recreate(self):
+        # Pool is recreated on invalidation and engine.dispose(), metrics are kept
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        pool.waits = self.waits
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.waits.append(wait)
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+            "wait_p95": percentile(waits),
+            "wait_max": self.wait_max
+        }
@@ -1,27 +1,17 @@
 from asyncio import current_task
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_scoped_session
-from sqlalchemy.orm import sessionmaker
-from bot.settings import DATABASE_URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
+from db.engine import engine, async_session
 
 
 class Sessions:
-    ENGINE = None
-
-    @classmethod
-    def __check_engine(cls):
-        if not cls.ENGINE:
-            cls.ENGINE = create_async_engine(DATABASE_URL, future=True, echo=False)
+    ENGINE = engine
+    SCOPED_SESSION = async_scoped_session(async_session, current_task)
 
     @classmethod
     async def get_session(cls) -> AsyncSession:
-        cls.__check_engine()
-        async_session = sessionmaker(cls.ENGINE, class_=AsyncSession, expire_on_commit=False, autoflush=False)
         async with async_session() as session:
             yield session
 
     @classmethod
     def get_scoped_session(cls):
-        cls.__check_engine()
-        scoped_session = async_scoped_session(sessionmaker(cls.ENGINE, class_=AsyncSession, expire_on_commit=False),
-                                              current_task)
-        return scoped_session()
+        return cls.SCOPED_SESSION()
@@ -1,10 +1,14 @@
+from utils.startup import startup_report  # first import, starts startup clock
 import asyncio
-from bot.exe_bots import exe_bot
-from db.create_tables import create_tables
+
+with startup_report.phase("imports"):
+    from bot.exe_bots import exe_bot
+    from db.create_tables import create_tables
 
 
 async def main():
-    await create_tables()
+    with startup_report.phase("schema check"):
+        await create_tables()
     await exe_bot()
 
 
@@ -0,0 +1,268 @@
+"""
+Run bot as N worker processes (shards). Supervisor receives updates (long polling or webhook) and routes
+each update to shard user_id % N, so FSM state, quota counters and jobs of a user stay in one process.
+SIGHUP restarts shards one by one, updates of restarting shard are buffered. SIGTERM/SIGINT stop everything.
+APIFY_MAX_CONCURRENT_RUNS, DB_POOL_SIZE, DB_MAX_OVERFLOW and SUMMARY_WORKERS are limits of the whole bot,
+each shard gets 1/N of them.
+"""
+import asyncio
+import hmac
+import os
+import secrets
+import signal
+import sys
+
+import aiohttp
+from aiohttp import web
+
+from bot.settings import BOT_TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, \
+    TELEGRAM_API_URL, SUPERVISOR_WORKERS, APIFY_MAX_CONCURRENT_RUNS, DB_POOL_SIZE, DB_MAX_OVERFLOW, SUMMARY_WORKERS
+from bot.webhook import SECRET_HEADER
+from db.create_tables import create_tables
+
+EXE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exe.py")
+# Limits configured for whole bot, each of N shards gets 1/N of them
+SHARED_LIMITS = {
+    "APIFY_MAX_CONCURRENT_RUNS": APIFY_MAX_CONCURRENT_RUNS,
+    "DB_POOL_SIZE": DB_POOL_SIZE,
+    "DB_MAX_OVERFLOW": DB_MAX_OVERFLOW,
+    "SUMMARY_WORKERS": SUMMARY_WORKERS
+}
+
+
+def update_user_id(update: dict) -> int:
+    """Id of user who sent update, chat id for updates without user"""
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            sender = value.get(field)
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+    return 0
+
+
+class Shard:
+    START_TIMEOUT = 60
+    STOP_TIMEOUT = 30
+    FORWARDERS = 8
+
+    def __init__(self, index: int, count: int, port: int, secret: str):
+        self.index = index
+        self.count = count
+        self.port = port
+        self.secret = secret
+        self.process: asyncio.subprocess.Process | None = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self.restarting = False
+        self.forwarded = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, session: aiohttp.ClientSession):
+        env = {
+            **os.environ,
+            "BOT_MODE": "webhook",
+            "WEBHOOK_URL": "",  # Webhook of Telegram is owned by supervisor
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(self.port),
+            "WEBHOOK_PATH": "/webhook",
+            "WEBHOOK_SECRET": self.secret,
+            "SHARD_INDEX": str(self.index),
+            "SHARD_COUNT": str(self.count),
+            **{name: str(max(1, limit // self.count)) for name, limit in SHARED_LIMITS.items()}
+        }
+        self.process = await asyncio.create_subprocess_exec(sys.executable, EXE_PATH, env=env)
+        print(f"Shard {self.index}: started process {self.process.pid} on port {self.port}")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.START_TIMEOUT
+        while loop.time() < deadline:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"Shard {self.index} exited with code {self.process.returncode} on start")
+            try:
+                async with session.get(f"{self.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status == 200:
+                        self.ready.set()
+                        print(f"Shard {self.index}: ready")
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+        raise RuntimeError(f"Shard {self.index} is not ready after {self.START_TIMEOUT}s")
+
+    async def stop(self):
+        self.ready.clear()
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=self.STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Shard {self.index}: process {self.process.pid} didn't stop, killing")
+            self.process.kill()
+            await self.process.wait()
+        print(f"Shard {self.index}: stopped")
+
+    async def restart(self, session: aiohttp.ClientSession):
+        self.restarting = True
+        try:
+            await self.stop()
+            await self.start(session)
+        finally:
+            self.restarting = False
+
+    async def forward(self, session: aiohttp.ClientSession):
+        """Post queued updates to shard, updates are kept in queue while shard is not ready"""
+        while True:
+            update = await self.queue.get()
+            try:
+                while True:
+                    await self.ready.wait()
+                    try:
+                        async with session.post(
+                            f"{self.url}/webhook", json=update, headers={SECRET_HEADER: self.secret}
+                        ) as response:
+                            if response.status == 200:
+                                self.forwarded += 1
+                                break
+                            print(f"Shard {self.index}: update {update.get('update_id')} got {response.status}")
+                    except aiohttp.ClientError as e:
+                        print(f"Shard {self.index}: failed to forward update: {e!r}")
+                    await asyncio.sleep(0.5)
+            finally:
+                self.queue.task_done()
+
+
+class Supervisor:
+    POLL_ERROR_MIN_DELAY = 1
+    POLL_ERROR_MAX_DELAY = 60
+
+    def __init__(self, workers: int, base_port: int):
+        secret = secrets.token_hex(16)
+        self.shards = [Shard(index, workers, base_port + index, secret) for index in range(workers)]
+        self.api_base = f"{(TELEGRAM_API_URL or 'https://api.telegram.org').rstrip('/')}/bot{BOT_TOKEN}"
+        self._stop = asyncio.Event()
+        self._restart_lock = asyncio.Lock()
+
+    def dispatch(self, update: dict):
+        shard = self.shards[update_user_id(update) % len(self.shards)]
+        shard.queue.put_nowait(update)
+
+    async def _call_api(self, session: aiohttp.ClientSession, method: str, **params):
+        params = {key: value for key, value in params.items() if value is not None}
+        async with session.post(f"{self.api_base}/{method}", json=params) as response:
+            return await response.json()
+
+    async def poll_updates(self, session: aiohttp.ClientSession):
+        await self._call_api(session, "deleteWebhook", drop_pending_updates=True)
+        offset = None
+        delay = self.POLL_ERROR_MIN_DELAY
+        while not self._stop.is_set():
+            params = {"timeout": 30}
+            if offset is not None:
+                params["offset"] = offset
+            try:
+                data = await self._call_api(session, "getUpdates", **params)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                data = {"ok": False, "description": repr(e)}
+            if not data.get("ok"):
+                # E.g. 409 when another poller is running or 401 for wrong token
+                print(f"Failed to get updates: {data.get('error_code')} {data.get('description')}, retry in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.POLL_ERROR_MAX_DELAY)
+                continue
+            delay = self.POLL_ERROR_MIN_DELAY
+            for update in data.get("result", []):
+                offset = update["update_id"] + 1
+                self.dispatch(update)
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET):
+            return web.Response(status=401)
+        self.dispatch(await request.json())
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response([
+            {
+                "shard": shard.index,
+                "pid": shard.process.pid if shard.process else None,
+                "ready": shard.ready.is_set(),
+                "queued": shard.queue.qsize(),
+                "forwarded": shard.forwarded
+            }
+            for shard in self.shards
+        ])
+
+    async def rolling_restart(self, session: aiohttp.ClientSession):
+        async with self._restart_lock:
+            print("Rolling restart of shards")
+            for shard in self.shards:
+                await shard.restart(session)
+
+    async def watch(self, session: aiohttp.ClientSession):
+        """Restart shards which exited unexpectedly"""
+        while not self._stop.is_set():
+            await asyncio.sleep(1)
+            for shard in self.shards:
+                if shard.restarting or shard.process is None or shard.process.returncode is None:
+                    continue
+                print(f"Shard {shard.index}: exited with code {shard.process.returncode}, restarting")
+                try:
+                    await shard.restart(session)
+                except RuntimeError as e:
+                    print(e)
+
+    async def run(self):
+        await create_tables()
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+            await asyncio.gather(*[shard.start(session) for shard in self.shards])
+            tasks = [
+                asyncio.create_task(shard.forward(session))
+                for shard in self.shards for _ in range(Shard.FORWARDERS)
+            ]
+            tasks.append(asyncio.create_task(self.watch(session)))
+
+            runner = web.AppRunner(web.Application())
+            runner.app.router.add_get("/health", self.health)
+            if BOT_MODE == "webhook":
+                runner.app.router.add_post(WEBHOOK_PATH, self.handle_webhook)
+            await runner.setup()
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            if BOT_MODE == "webhook":
+                if WEBHOOK_URL:
+                    await self._call_api(
+                        session, "setWebhook",
+                        url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None
+                    )
+            else:
+                tasks.append(asyncio.create_task(self.poll_updates(session)))
+
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.rolling_restart(session)))
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self._stop.set)
+            print(f"Supervisor started {len(self.shards)} shards, listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+
+            await self._stop.wait()
+            print("Supervisor stopping")
+            await runner.cleanup()
+            # Deliver already received updates before shards are stopped
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*[shard.queue.join() for shard in self.shards]), timeout=Shard.STOP_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print("Not all received updates were delivered to shards")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*[shard.stop() for shard in self.shards])
+
+
+if __name__ == "__main__":
+    asyncio.run(Supervisor(workers=SUPERVISOR_WORKERS, base_port=WEBHOOK_PORT + 1).run())
@@ -0,0 +1,30 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Required settings of bot.settings, DB is a temporary SQLite file
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+for name in ("BOT_TOKEN", "OPENAI_API_KEY", "ASSISTANT_ID", "YOUTUBE_API_KEY", "TELEGRAM_CHANNEL_ID", "APIFY_TOKEN"):
+    os.environ.setdefault(name, "123:test" if name == "BOT_TOKEN" else "test")
+
+
+@pytest.fixture
+def run_db():
+    """Run coroutine with empty tables, pooled connections are closed after it (each test has own event loop)"""
+    from db.create_tables import create_tables
+    from db.engine import Base, engine
+
+    def run(coro):
+        async def main():
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await create_tables(force=True)
+            try:
+                return await coro
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    return run
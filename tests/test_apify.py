@@ -0,0 +1,81 @@
+import asyncio
+
+from api_integration.apify_api import ApifyService
+from api_integration.apify_fake import FakeApifyClientAsync
+
+
+def _service(max_concurrent_runs: int, latency: float, hedge_percentile: float) -> ApifyService:
+    client = FakeApifyClientAsync(latency=latency)
+    service = ApifyService(
+        apify_key="",
+        max_concurrent_runs=max_concurrent_runs,
+        hedge_percentile=hedge_percentile,
+        apify_client=client
+    )
+    return service
+
+
+def test_time_in_scheduler_queue_does_not_start_hedged_runs():
+    async def main():
+        service = _service(max_concurrent_runs=4, latency=0.05, hedge_percentile=0.95)
+        service.run_durations[service.ACTOR_POSTS_X_ID].extend([0.1] * service.LATENCY_MIN_SAMPLES)
+        await asyncio.gather(*[
+            service._call_actor(service.ACTOR_POSTS_X_ID, {"startUrls": [f"https://x.com/user{i}"]}, i, hedge=True)
+            for i in range(20)
+        ])
+        return service
+
+    service = asyncio.run(main())
+    assert service.hedged_runs == 0
+    assert service.apify_client.started_runs == 20
+
+
+def test_slow_run_in_slot_is_hedged():
+    async def main():
+        service = _service(max_concurrent_runs=4, latency=0.2, hedge_percentile=0.95)
+        service.run_durations[service.ACTOR_POSTS_X_ID].extend([0.05] * service.LATENCY_MIN_SAMPLES)
+        dataset_id = await service._call_actor(
+            service.ACTOR_POSTS_X_ID, {"startUrls": ["https://x.com/user"]}, 1, hedge=True
+        )
+        return service, dataset_id
+
+    service, dataset_id = asyncio.run(main())
+    assert dataset_id
+    assert service.hedged_runs == 1
+    assert service.apify_client.aborted_runs == 1
+
+
+def test_batch_posts_are_split_by_author_with_limit_per_profile():
+    async def main():
+        service = ApifyService(apify_key="", posts_batch_size=3, apify_client=FakeApifyClientAsync(latency=0))
+        names = ["elonmusk", "nasa", "python", "nasa_1", "nasa_2", "nasa_3", "nasa_5"]
+        results = {}
+        for batch in service.split_into_batches(names):
+            results.update(await service.run_get_x_posts_batch(batch, max_items=5))
+        return names, results
+
+    names, results = asyncio.run(main())
+    assert list(results) == names
+    for name, posts in results.items():
+        # Busy profiles early in a batch don't take the item limit of later ones
+        assert len(posts) == 5
+        assert {post.author for post in posts} == {name}
+
+
+def test_profile_without_own_posts_in_capped_run_is_not_reported_empty():
+    async def main():
+        client = FakeApifyClientAsync(latency=0)
+        service = ApifyService(apify_key="", apify_client=client)
+        original = client._make_posts
+
+        def posts_of_other_author(run_input: dict) -> list[dict]:
+            items = original(run_input)
+            for item in items:
+                item["author"]["userName"] = "someone_else"
+            return items
+
+        client._make_posts = posts_of_other_author
+        return await service.run_get_x_posts_batch(["python", "nasa"], max_items=5)
+
+    # Feed of retweets filled the item limit, profiles are not scraped rather than empty
+    assert asyncio.run(main()) == {}
@@ -0,0 +1,25 @@
+import asyncio
+
+from api_integration.apify_coalescer import SingleFlight
+
+
+def test_coalescer_runs_identical_calls_once():
+    async def main():
+        coalescer = SingleFlight()
+        calls = 0
+
+        async def func():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "dataset"
+
+        key_a = coalescer.make_key("actor", {"handles": ["A", "b"]})
+        key_b = coalescer.make_key("actor", {"handles": ["B", "a"]})
+        results = await asyncio.gather(*[coalescer.do(key, func) for key in (key_a, key_b, key_a)])
+        return calls, results, coalescer.stats()
+
+    calls, results, stats = asyncio.run(main())
+    assert calls == 1
+    assert results == ["dataset"] * 3
+    assert stats["hits"] == 2 and stats["in_flight"] == 0
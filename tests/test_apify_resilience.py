@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import pytest
+
+from api_integration.apify_resilience import CircuitBreaker, CircuitOpenError, retry_with_backoff
+
+
+def test_circuit_breaker_opens_and_probes_after_reset_timeout():
+    breaker = CircuitBreaker("actor", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_retry_with_backoff_retries_failures_but_not_open_circuit():
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise RuntimeError("run failed")
+        return "ok"
+
+    async def circuit_open():
+        nonlocal calls
+        calls += 1
+        raise CircuitOpenError("open")
+
+    assert asyncio.run(retry_with_backoff(flaky, attempts=3, base_delay=0.001)) == "ok"
+    assert calls == 3
+
+    calls = 0
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(retry_with_backoff(circuit_open, attempts=3, base_delay=0.001))
+    assert calls == 1
@@ -0,0 +1,48 @@
+import asyncio
+
+from api_integration.apify_scheduler import FairScheduler
+
+
+def test_scheduler_limits_concurrency_and_serves_users_round_robin():
+    async def main():
+        scheduler = FairScheduler(max_concurrency=2)
+        running = 0
+        peak = 0
+        order = []
+
+        async def run(user_id: int, number: int):
+            nonlocal running, peak
+            async with scheduler.slot(user_id):
+                running += 1
+                peak = max(peak, running)
+                order.append(user_id)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        # User 1 queues many runs before user 2, user 2 must not wait for all of them
+        tasks = [asyncio.create_task(run(1, i)) for i in range(6)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(run(2, i)) for i in range(2)]
+        await asyncio.gather(*tasks)
+        return peak, order, scheduler
+
+    peak, order, scheduler = asyncio.run(main())
+    assert peak == 2
+    assert order.index(2) < 4
+    assert scheduler.running == 0 and scheduler.queue_depth == 0
+
+
+def test_scheduler_cancelled_waiter_releases_queue_position():
+    async def main():
+        scheduler = FairScheduler(max_concurrency=1)
+        await scheduler.acquire(1)
+        waiter = asyncio.create_task(scheduler.acquire(2))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert scheduler.queue_depth == 0 and scheduler.running == 0
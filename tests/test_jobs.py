@@ -0,0 +1,84 @@
+import asyncio
+
+from bot.jobs import SummaryJobQueue
+from db.models.search_session import SearchSessionCRUD
+from db.models.user import UserCRUD
+
+
+async def _user() -> int:
+    user = await UserCRUD().create(id=1, first_name="User", chosen_language="en")
+    return user.id
+
+
+def _queue(lease_seconds: float = 60):
+    """Queue and its handler which records ids of handled jobs"""
+    queue = SummaryJobQueue(SearchSessionCRUD(), workers=2, lease_seconds=lease_seconds)
+    handled = []
+
+    async def handler(job):
+        handled.append(job.id)
+        await asyncio.sleep(0.01)
+
+    return queue, handler, handled
+
+
+def test_jobs_of_live_queue_are_not_claimed_by_other_process(run_db):
+    async def main():
+        user_id = await _user()
+        first, _, first_handled = _queue()
+        second, second_handler, second_handled = _queue()
+        # Jobs persisted by first process, its workers are not started yet
+        jobs = [await first.submit(user_id, 1, f"profile{i}", "en") for i in range(3)]
+        await second.start(second_handler)
+        await asyncio.sleep(0.05)
+        claimed_by_live = list(second_handled)
+
+        # Stopped queue releases its jobs, other process claims them at once
+        await first.close()
+        claimed = await second._claim()
+        await asyncio.sleep(0.1)
+        await second.close()
+        return claimed_by_live, claimed, sorted(second_handled), sorted(job.id for job in jobs), first_handled
+
+    claimed_by_live, claimed, second_handled, job_ids, first_handled = run_db(main())
+    assert claimed_by_live == []
+    assert claimed == 3
+    assert second_handled == job_ids
+    assert first_handled == []
+
+
+def test_jobs_of_crashed_process_are_claimed_after_lease(run_db):
+    async def main():
+        user_id = await _user()
+        crashed, _, _ = _queue(lease_seconds=0.1)
+        job = await crashed.submit(user_id, 1, "profile", "en")
+        # Crashed process neither heartbeats nor releases its jobs
+        survivor, handler, handled = _queue(lease_seconds=0.1)
+        await survivor.start(handler)
+        before_expiry = list(handled)
+        await asyncio.sleep(0.3)
+        await survivor.close()
+        return before_expiry, handled, job.id
+
+    before_expiry, handled, job_id = run_db(main())
+    assert before_expiry == []
+    assert handled == [job_id]
+
+
+def test_concurrent_submits_over_queue_size_are_rejected_before_persisting(run_db):
+    async def main():
+        user_id = await _user()
+        crud = SearchSessionCRUD()
+        queue = SummaryJobQueue(crud, workers=1, max_queue_size=2)
+        results = await asyncio.gather(
+            *[queue.submit(user_id, 1, f"profile{i}", "en") for i in range(5)], return_exceptions=True
+        )
+        return results, queue.depth, await crud.get_user_sessions(user_id)
+
+    results, depth, sessions = run_db(main())
+    accepted = [result for result in results if not isinstance(result, BaseException)]
+    assert len(accepted) == 2
+    assert all(isinstance(result, asyncio.QueueFull) for result in results if result not in accepted)
+    # Every persisted job is in the queue
+    assert depth == 2
+    assert sorted(session.id for session in sessions) == sorted(job.id for job in accepted)
@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from api_integration.records import MISSING, PostRecord
+from db import create_tables as create_tables_module
+from db.create_tables import create_tables
+from db.engine import Base, engine
+from db import migrations
+from db.migrations import SchemaMismatchError, migrate
+from db.models.post import PostCRUD
+from db.models.profile import ProfileCRUD
+from db.models.search_session import SearchSession, SearchSessionCRUD
+
+# Schema created by the first release of the bot (SQLite DDL of its models)
+BASELINE_SCHEMA = """
+CREATE TABLE profiles (
+    id INTEGER NOT NULL, username VARCHAR NOT NULL, full_name VARCHAR, twitter_id INTEGER NOT NULL,
+    followers_count INTEGER, last_checked DATETIME, PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_profiles_username ON profiles (username);
+CREATE TABLE search_algorithms (
+    id INTEGER NOT NULL, name VARCHAR NOT NULL, friends_limit INTEGER, hours_limit INTEGER NOT NULL,
+    created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR, first_name VARCHAR NOT NULL, last_name VARCHAR,
+    chosen_language VARCHAR NOT NULL, PRIMARY KEY (id)
+);
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE posts (
+    id INTEGER NOT NULL, profile_id INTEGER NOT NULL, content TEXT NOT NULL, post_url VARCHAR NOT NULL,
+    timestamp DATETIME NOT NULL, retrieved_at DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(profile_id) REFERENCES profiles (id)
+);
+CREATE INDEX ix_posts_timestamp ON posts (timestamp);
+CREATE TABLE search_sessions (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, profile_id INTEGER NOT NULL, algorithm_id INTEGER NOT NULL,
+    started_at DATETIME NOT NULL, finished_at DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(profile_id) REFERENCES profiles (id),
+    FOREIGN KEY(algorithm_id) REFERENCES search_algorithms (id)
+);
+CREATE TABLE user_requests (
+    id INTEGER NOT NULL, user_id INTEGER NOT NULL, timestamp DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_user_requests_id ON user_requests (id);
+CREATE TABLE summaries (
+    id INTEGER NOT NULL, session_id INTEGER NOT NULL, summary_text TEXT NOT NULL, created_at DATETIME NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(session_id) REFERENCES search_sessions (id)
+);
+INSERT INTO users (id, first_name, chosen_language) VALUES (1, 'User', 'en');
+INSERT INTO profiles (id, username, twitter_id, followers_count) VALUES (1, 'nasa', 1, 10);
+INSERT INTO search_algorithms (id, name, hours_limit, created_at) VALUES (1, 'default', 24, '2024-01-01 00:00:00');
+INSERT INTO posts (profile_id, content, post_url, timestamp, retrieved_at)
+    VALUES (1, 'Launch', 'https://x.com/nasa/status/1', '2024-01-01 00:00:00', '2024-01-01 00:00:00');
+INSERT INTO search_sessions (id, user_id, profile_id, algorithm_id, started_at)
+    VALUES (1, 1, 1, 1, '2024-01-01 00:00:00');
+INSERT INTO summaries (session_id, summary_text, created_at) VALUES (1, 'Digest', '2024-01-01 00:00:00');
+"""
+
+
+def run_on_baseline(coro_function):
+    """Run coroutine function on DB with baseline schema, pooled connections are closed after it"""
+    async def main():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            for statement in BASELINE_SCHEMA.split(";"):
+                if statement.strip():
+                    await conn.execute(text(statement))
+        try:
+            return await coro_function()
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+async def _stored_version() -> str | None:
+    async with engine.connect() as conn:
+        return await conn.run_sync(create_tables_module._stored_version)
+
+
+def test_unmigrated_schema_fails_without_recording_version(monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATIONS", [])
+
+    async def main():
+        with pytest.raises(SchemaMismatchError) as error:
+            await create_tables()
+        return str(error.value), await _stored_version()
+
+    message, version = run_on_baseline(main)
+    assert "column posts.like_count is missing" in message
+    assert version is None
+
+
+def test_profiles_are_migrated_from_baseline():
+    async def main():
+        async with engine.begin() as conn:
+            await conn.run_sync(migrate)
+        return await ProfileCRUD().get_by_username("nasa")
+
+    profile = run_on_baseline(main)
+    assert (profile.followers_count, profile.last_post_timestamp, profile.last_post_url) == (10, None, None)
+
+
+def test_posts_are_migrated_from_baseline():
+    async def main():
+        async with engine.begin() as conn:
+            await conn.run_sync(migrate)
+        post = PostRecord(
+            author="nasa",
+            followers_count=10,
+            content="Landing",
+            url="https://x.com/nasa/status/2",
+            like_count=5,
+            reply_count=MISSING,
+            retweet_count=1,
+            view_count=100,
+            timestamp=datetime(2024, 1, 2, tzinfo=timezone.utc)
+        )
+        await PostCRUD().add_posts_bulk({1: [post]})
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT post_url, like_count, reply_count FROM posts ORDER BY id"))
+            return result.all()
+
+    rows = run_on_baseline(main)
+    assert [tuple(row) for row in rows] == [
+        ("https://x.com/nasa/status/1", None, None),
+        ("https://x.com/nasa/status/2", 5, None)
+    ]
+
+
+def test_baseline_database_is_upgraded_for_summary_jobs():
+    async def main():
+        await create_tables()
+        version = await _stored_version()
+        crud = SearchSessionCRUD()
+        job = await crud.create_job(user_id=1, chat_id=1, instruction="", language="en", owner=None)
+        old_session = await crud.read(1)
+        claimed = await crud.claim_unfinished_jobs("worker", lease_seconds=60, limit=10)
+        async with engine.connect() as conn:
+            summaries = (await conn.execute(text("SELECT session_id FROM summaries"))).scalars().all()
+        return version, job, old_session, claimed, summaries
+
+    version, job, old_session, claimed, summaries = run_on_baseline(main)
+    assert version == create_tables_module.schema_version()
+    assert (old_session.status, old_session.profile_id) == (SearchSession.STATUS_DONE, 1)
+    # Finished sessions of the old version are not run as jobs
+    assert [claimed_job.id for claimed_job in claimed] == [job.id]
+    assert summaries == [1]
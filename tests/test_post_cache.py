@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from api_integration.apify_api import ApifyService
+from api_integration.apify_fake import FakeApifyClientAsync
+from api_integration.post_cache import PostCache
+from api_integration.records import PostRecord
+from db.facade import DB
+from db.models.profile import ProfileCRUD
+
+
+def _post(index: int) -> PostRecord:
+    return PostRecord(
+        author="user",
+        followers_count=1,
+        content=f"post {index}",
+        url=f"https://x.com/user/status/{index}",
+        like_count=0,
+        reply_count=0,
+        retweet_count=0,
+        view_count=0,
+        timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index)
+    )
+
+
+def test_merged_posts_are_limited_to_newest_max_items():
+    stored = [_post(i) for i in range(5)]
+    delta = [_post(i) for i in range(4, 8)]
+    merged = PostCache._merge_posts(stored, delta, max_items=3)
+    assert [post.url for post in merged] == [_post(i).url for i in (7, 6, 5)]
+
+
+def _post_cache(client: FakeApifyClientAsync) -> PostCache:
+    service = ApifyService(apify_key="", posts_batch_size=3, apify_client=client)
+    return PostCache(service, DB())
+
+
+async def _profiles(names: list[str]):
+    for i, name in enumerate(names):
+        await ProfileCRUD().create(username=name, twitter_id=i)
+
+
+def test_scraped_profiles_are_cached_and_capped_on_both_paths(run_db):
+    async def main():
+        names = ["elonmusk", "nasa", "python", "nasa_1", "nasa_2", "nasa_3", "nasa_5"]
+        await _profiles(names)
+        client = FakeApifyClientAsync(latency=0)
+        post_cache = _post_cache(client)
+        scraped, _ = await post_cache.get_posts(names, max_items=5)
+        runs = client.started_runs
+        fresh, _ = await post_cache.get_posts(names, max_items=3)
+        return scraped, fresh, client.started_runs - runs
+
+    scraped, fresh, new_runs = run_db(main())
+    assert {name: len(posts) for name, posts in scraped.items()} == {name: 5 for name in scraped}
+    # Fresh profiles are served from DB with the same limit per profile
+    assert new_runs == 0
+    assert {name: len(posts) for name, posts in fresh.items()} == {name: 3 for name in fresh}
+
+
+def test_profile_not_scraped_completely_is_not_marked_checked(run_db):
+    async def main():
+        await _profiles(["python"])
+        client = FakeApifyClientAsync(latency=0)
+        original = client._make_posts
+
+        def posts_of_other_author(run_input: dict) -> list[dict]:
+            items = original(run_input)
+            for item in items:
+                item["author"]["userName"] = "someone_else"
+            return items
+
+        client._make_posts = posts_of_other_author
+        post_cache = _post_cache(client)
+        posts, skipped = await post_cache.get_posts(["python"], max_items=5)
+        return posts, skipped, await ProfileCRUD().get_by_username("python")
+
+    posts, skipped, profile = run_db(main())
+    assert posts == {"python": []}
+    assert skipped == {"python": PostCache.SKIPPED_FAILED}
+    assert profile.last_checked is None
@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from db.engine import engine
+from db.models.profile import ProfileCRUD
+
+
+def test_mark_checked_updates_profiles_in_one_statement(run_db):
+    async def main():
+        crud = ProfileCRUD()
+        profiles = [await crud.create(username=f"user{i}", twitter_id=i, followers_count=10) for i in range(3)]
+        posted_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        values = {
+            profiles[0].id: {"last_post_timestamp": posted_at, "last_post_url": "https://x.com/0", "followers_count": 5},
+            profiles[1].id: {"last_post_timestamp": posted_at, "last_post_url": "https://x.com/1"}
+        }
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            await crud.mark_checked([profile.id for profile in profiles], values)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+        return statements, await crud.get_by_usernames([profile.username for profile in profiles])
+
+    statements, profiles = run_db(main())
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 1
+    assert all(profile.last_checked is not None for profile in profiles.values())
+    assert (profiles["user0"].followers_count, profiles["user0"].last_post_url) == (5, "https://x.com/0")
+    # Unknown values keep what is stored
+    assert (profiles["user1"].followers_count, profiles["user1"].last_post_url) == (10, "https://x.com/1")
+    assert (profiles["user2"].last_post_timestamp, profiles["user2"].last_post_url) == (None, None)
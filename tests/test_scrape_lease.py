@@ -0,0 +1,63 @@
+import asyncio
+
+from sqlalchemy import event
+
+from db.engine import engine
+from db.models.profile import ProfileCRUD
+from db.models.scrape_lease import ScrapeLeaseCRUD
+
+
+async def _profiles(count: int) -> list[int]:
+    crud = ProfileCRUD()
+    return [(await crud.create(username=f"user{i}", twitter_id=i)).id for i in range(count)]
+
+
+def test_acquire_many_uses_constant_number_of_statements(run_db):
+    async def main():
+        profile_ids = await _profiles(100)
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            leased = await ScrapeLeaseCRUD().acquire_many(profile_ids, "posts", 60, ScrapeLeaseCRUD.new_owner())
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+        return profile_ids, leased, statements
+
+    profile_ids, leased, statements = run_db(main())
+    assert leased == set(profile_ids)
+    assert len([s for s in statements if not s.startswith("PRAGMA")]) == 3
+
+
+def test_lease_is_not_shared_between_owners_of_one_process(run_db):
+    async def main():
+        profile_id, = await _profiles(1)
+        crud = ScrapeLeaseCRUD()
+        first, second = crud.new_owner(), crud.new_owner()
+        results = await asyncio.gather(
+            crud.try_acquire(profile_id, "posts", 60, first),
+            crud.try_acquire(profile_id, "posts", 60, second)
+        )
+        winner, loser = (first, second) if results[0] else (second, first)
+        held_for_loser = await crud.get_held([profile_id], "posts", loser)
+        # Only owner's release frees the lease
+        await crud.release_many([profile_id], "posts", loser)
+        still_held = await crud.get_held([profile_id], "posts", loser)
+        await crud.release_many([profile_id], "posts", winner)
+        reacquired = await crud.try_acquire(profile_id, "posts", 60, loser)
+        return sorted(results), held_for_loser, still_held, reacquired, profile_id
+
+    results, held_for_loser, still_held, reacquired, profile_id = run_db(main())
+    assert results == [False, True]
+    assert held_for_loser == still_held == {profile_id}
+    assert reacquired
+
+
+def test_expired_lease_is_taken_over(run_db):
+    async def main():
+        profile_id, = await _profiles(1)
+        crud = ScrapeLeaseCRUD()
+        await crud.try_acquire(profile_id, "posts", -1, crud.new_owner())
+        return await crud.try_acquire(profile_id, "posts", 60, crud.new_owner())
+
+    assert run_db(main())
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+import tiktoken
+
+from api_integration.llm_fake import FakeLLM
+from api_integration.records import PostRecord
+from api_integration.summarizer import PostsSummarizer
+from utils.tokens import TokenCounter
+
+
+def _token_counter() -> TokenCounter:
+    """Counter with byte-level encoder (one token per byte), real encoders are downloaded"""
+    counter = TokenCounter()
+    counter._encoding = tiktoken.Encoding(
+        name="bytes",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={}
+    )
+    return counter
+
+
+def _summarizer(chunk_tokens: int) -> PostsSummarizer:
+    return PostsSummarizer(FakeLLM(latency=0, words_per_line=100), _token_counter(), chunk_tokens=chunk_tokens)
+
+
+def _post(index: int, content: str) -> PostRecord:
+    return PostRecord(
+        author=f"u{index}",
+        followers_count=1,
+        content=content,
+        url=f"https://x.com/u{index}/status/{index}",
+        like_count=0,
+        reply_count=0,
+        retweet_count=0,
+        view_count=0,
+        timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc)
+    )
+
+
+def test_texts_are_packed_in_order_under_budget():
+    chunks = asyncio.run(_summarizer(chunk_tokens=10).pack_chunks(["aaaa", "bbbb", "cccc", "dddd", "eeee"]))
+    # Every text costs its tokens and a newline
+    assert chunks == ["aaaa\nbbbb", "cccc\ndddd", "eeee"]
+
+
+def test_text_over_budget_is_truncated():
+    chunks = asyncio.run(_summarizer(chunk_tokens=10).pack_chunks(["short", "x" * 25, "end"]))
+    assert chunks == ["short", "x" * 10, "end"]
+
+
+def test_summaries_filling_chunks_are_reduced_in_pairs():
+    async def main():
+        summarizer = _summarizer(chunk_tokens=40)
+        prompts = []
+        complete = summarizer.llm.complete
+
+        async def recording_complete(system: str, prompt: str, model: str = None) -> str:
+            prompts.append(prompt)
+            return await complete(system, prompt, model)
+
+        summarizer.llm.complete = recording_complete
+        # Every post fills a chunk, and its summary (as long as the post) fills a chunk too
+        posts = [_post(i, " ".join(f"w{i}{j}xx" for j in range(5))) for i in range(4)]
+        digest = await asyncio.wait_for(summarizer.summarize(posts), timeout=5)
+        return digest, prompts, await summarizer.token_counter.count_batch(prompts)
+
+    digest, prompts, prompt_tokens = asyncio.run(main())
+    assert digest
+    # 4 map calls, then 2 and 1 pairwise reduce calls
+    assert len(prompts) == 7
+    assert max(prompt_tokens) <= 40
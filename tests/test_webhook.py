@@ -0,0 +1,89 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.telegram_fake import FakeTelegramServer
+from bot.webhook import SECRET_HEADER, WebhookServer
+
+
+def _server(handled: list, release: asyncio.Event, max_queue_size: int) -> WebhookServer:
+    dispatcher = Dispatcher()
+
+    @dispatcher.message()
+    async def handle(message):
+        handled.append(message.from_user.id)
+        await release.wait()
+
+    return WebhookServer(
+        dispatcher=dispatcher,
+        bot=Bot("123:test"),
+        secret="secret",
+        workers=1,
+        max_queue_size=max_queue_size
+    )
+
+
+def test_update_with_wrong_secret_is_rejected():
+    async def main():
+        release = asyncio.Event()
+        release.set()
+        handled = []
+        server = _server(handled, release, max_queue_size=10)
+        update = FakeTelegramServer().make_update(1, "/start")
+        async with TestClient(TestServer(server.create_app())) as client:
+            missing = await client.post("/webhook", json=update)
+            wrong = await client.post("/webhook", json=update, headers={SECRET_HEADER: "wrong"})
+            accepted = await client.post("/webhook", json=update, headers={SECRET_HEADER: "secret"})
+            statuses = missing.status, wrong.status, accepted.status
+        await server.bot.session.close()
+        return statuses, handled
+
+    statuses, handled = asyncio.run(main())
+    assert statuses == (401, 401, 200)
+    # Accepted update is processed before shutdown
+    assert handled == [1]
+
+
+def test_update_is_rejected_with_503_when_queue_is_full():
+    async def main():
+        release = asyncio.Event()
+        handled = []
+        server = _server(handled, release, max_queue_size=1)
+        telegram = FakeTelegramServer()
+        headers = {SECRET_HEADER: "secret"}
+        async with TestClient(TestServer(server.create_app())) as client:
+            # First update blocks the only worker, second one fills the queue
+            first = await client.post("/webhook", json=telegram.make_update(1, "a"), headers=headers)
+            while not handled:
+                await asyncio.sleep(0.01)
+            second = await client.post("/webhook", json=telegram.make_update(2, "b"), headers=headers)
+            third = await client.post("/webhook", json=telegram.make_update(3, "c"), headers=headers)
+            stats = server.stats()
+            release.set()
+            statuses = first.status, second.status, third.status
+        await server.bot.session.close()
+        return statuses, stats, handled
+
+    statuses, stats, handled = asyncio.run(main())
+    assert statuses == (200, 200, 503)
+    assert (stats["received"], stats["rejected"]) == (2, 1)
+    assert handled == [1, 2]
+
+
+def test_health_serves_stats_of_bot_components():
+    async def main():
+        server = WebhookServer(
+            dispatcher=Dispatcher(),
+            bot=Bot("123:test"),
+            stats_provider=lambda: {"quota": {"users": 1}}
+        )
+        async with TestClient(TestServer(server.create_app())) as client:
+            response = await client.get("/health")
+            body = await response.json()
+        await server.bot.session.close()
+        return body
+
+    body = asyncio.run(main())
+    assert body["quota"] == {"users": 1}
+    assert body["webhook"]["received"] == 0
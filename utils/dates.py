@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+def as_utc(value: datetime) -> datetime:
+    """DB returns naive datetimes, all stored datetimes are in UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
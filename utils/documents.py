@@ -0,0 +1,68 @@
+import gzip
+import io
+
+from aiogram.types import BufferedInputFile
+
+from api_integration.records import PostRecord, metric_text
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bots can upload documents up to 50 MB
+TELEGRAM_DOCUMENT_MAX_BYTES = 50 * 1024 * 1024
+
+
+def _render_post(number: int, post: PostRecord) -> bytes:
+    return (
+        f"Post {number} by @{post.author} who has: \n"
+        f"{metric_text(post.followers_count)} followers\n"
+        f"{metric_text(post.like_count)} likes\n"
+        f"{metric_text(post.view_count)} views\n"
+        f"{metric_text(post.reply_count)} replies\n"
+        f"{metric_text(post.retweet_count)} retweets:\n"
+        f"{post.content}\n\n"
+    ).encode("utf-8")
+
+
+def _compress(data: bytes, compression: str | None) -> tuple[bytes, str]:
+    """Returns compressed data and file extension"""
+    if compression == "zstd":
+        if zstandard is not None:
+            return zstandard.ZstdCompressor().compress(data), ".zst"
+        print("zstandard is not installed, gzip is used for documents")
+        compression = "gzip"
+    if compression == "gzip":
+        return gzip.compress(data), ".gz"
+    return data, ""
+
+
+def render_posts_documents(
+        posts: list[PostRecord],
+        filename: str = "posts.txt",
+        compression: str = None,
+        max_bytes: int = TELEGRAM_DOCUMENT_MAX_BYTES
+    ) -> list[BufferedInputFile]:
+    """
+    Render posts into in-memory documents, splitting them into parts of at most `max_bytes`.
+    Blocking, should be run in a thread for many posts.
+    """
+    parts = []
+    part = io.BytesIO()
+    for number, post in enumerate(posts, start=1):
+        chunk = _render_post(number, post)
+        if part.tell() and part.tell() + len(chunk) > max_bytes:
+            parts.append(part.getvalue())
+            part = io.BytesIO()
+        part.write(chunk)
+    if part.tell():
+        parts.append(part.getvalue())
+
+    name, dot, extension = filename.rpartition(".")
+    documents = []
+    for index, data in enumerate(parts, start=1):
+        data, compressed_extension = _compress(data, compression)
+        part_name = filename if len(parts) == 1 else f"{name}_part{index}{dot}{extension}"
+        documents.append(BufferedInputFile(data, filename=part_name + compressed_extension))
+    return documents
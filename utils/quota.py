@@ -0,0 +1,80 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+
+class RequestQuota:
+    """
+    Daily request quota of users, counted in memory.
+    Counters are rebuilt from user_requests table on start, new requests are written to DB in batches.
+    Counters are per process, bot processes must not share users (see supervisor sharding).
+    """
+
+    def __init__(self, user_request_crud, daily_limit: int = 10, flush_interval: float = 5.0, batch_size: int = 100):
+        self.user_request_crud = user_request_crud
+        self.daily_limit = daily_limit
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._day = date.today()
+        self._counts: dict[int, int] = {}
+        self._pending: list[dict] = []
+        self._flush_requested = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self._counts.clear()
+
+    async def start(self):
+        self._day = date.today()
+        self._counts = await self.user_request_crud.get_daily_requests_summary()
+        print(f"Request quota: restored counters of {len(self._counts)} users")
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def count(self, user_id: int) -> int:
+        self._roll_day()
+        return self._counts.get(user_id, 0)
+
+    def is_allowed(self, user_id: int) -> bool:
+        return self.count(user_id) < self.daily_limit
+
+    def record(self, user_id: int):
+        self._roll_day()
+        self._counts[user_id] = self._counts.get(user_id, 0) + 1
+        self._pending.append({"user_id": user_id, "timestamp": datetime.now(timezone.utc)})
+        if len(self._pending) >= self.batch_size:
+            self._flush_requested.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await self.user_request_crud.add_requests_bulk(rows)
+        except Exception as e:
+            print(f"Failed to save {len(rows)} user requests, will retry: {e}")
+            self._pending = rows + self._pending
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {"users": len(self._counts), "pending": len(self._pending)}
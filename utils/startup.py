@@ -0,0 +1,51 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable
+
+
+class StartupReport:
+    """Time of startup phases, clock starts when this module is imported (first import of exe.py)"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        self._warm_up_task: asyncio.Task | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> str:
+        lines = [f"  {name:<24} {seconds * 1000:9.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'total':<24} {(time.perf_counter() - self.started_at) * 1000:9.1f} ms")
+        return "Startup:\n" + "\n".join(lines)
+
+    async def _warm_up(self, clients: dict[str, Callable[[], Awaitable]]):
+        async def run(name: str, warm_up: Callable[[], Awaitable]) -> str:
+            start = time.perf_counter()
+            try:
+                await warm_up()
+                status = "ok"
+            except Exception as e:
+                status = f"failed: {e!r}"
+            return f"  {name:<24} {(time.perf_counter() - start) * 1000:9.1f} ms {status}"
+
+        lines = await asyncio.gather(*[run(name, warm_up) for name, warm_up in clients.items()])
+        print("Warm-up:\n" + "\n".join(lines))
+
+    def start_warm_up(self, clients: dict[str, Callable[[], Awaitable]]):
+        """Warm up clients concurrently in background, failures are only reported (clients retry on use)"""
+        self._warm_up_task = asyncio.create_task(self._warm_up(clients))
+
+    async def stop_warm_up(self):
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+
+
+startup_report = StartupReport()
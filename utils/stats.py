@@ -0,0 +1,44 @@
+import asyncio
+from typing import Callable, Sequence
+
+
+def mean(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def percentile(sorted_values: Sequence[float], fraction: float = 0.95) -> float:
+    """Nearest-rank percentile of already sorted values, 0.0 when there are no values"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class StatsLogger:
+    """Prints stats of process components every `interval` seconds (0 disables), and once more on close"""
+
+    def __init__(self, collect: Callable[[], dict], interval: float = 300):
+        self.collect = collect
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.log()
+
+    def log(self):
+        try:
+            print(f"Stats: {self.collect()}")
+        except Exception as e:
+            print(f"Failed to collect stats: {e!r}")
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.log()
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import threading
+
+import tiktoken
+
+from utils.cache import TTLCache
+
+
+class TokenCounter:
+    """
+    Token counting with one encoder per process. Counts are cached by hash of text content,
+    batches with more than `thread_min_chars` uncached characters are encoded in a thread
+    (tiktoken releases GIL while encoding, so event loop keeps serving updates).
+    """
+
+    def __init__(
+            self,
+            encoding_name: str = "cl100k_base",
+            cache_size: int = 50000,
+            cache_ttl: float = 24 * 3600,
+            thread_min_chars: int = 20000
+        ):
+        self.encoding_name = encoding_name
+        self.thread_min_chars = thread_min_chars
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._encoding = None
+        self._encoding_lock = threading.Lock()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        """Encoder is loaded on first use (it may be downloaded), blocking"""
+        if self._encoding is None:
+            with self._encoding_lock:
+                if self._encoding is None:
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
+    async def warm_up(self):
+        await asyncio.to_thread(lambda: self.encoding)
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _encode_lengths(self, texts: list[str]) -> list[int]:
+        return [len(tokens) for tokens in self.encoding.encode_batch(texts, disallowed_special=())]
+
+    async def count_batch(self, texts: list[str]) -> list[int]:
+        keys = [self._key(text) for text in texts]
+        counts = []
+        missing = []
+        for index, key in enumerate(keys):
+            found, count = self.cache.get(key)
+            counts.append(count)
+            if not found:
+                missing.append(index)
+        if not missing:
+            return counts
+
+        missing_texts = [texts[index] for index in missing]
+        if self._encoding is None or sum(map(len, missing_texts)) >= self.thread_min_chars:
+            lengths = await asyncio.to_thread(self._encode_lengths, missing_texts)
+        else:
+            lengths = self._encode_lengths(missing_texts)
+        for index, length in zip(missing, lengths):
+            counts[index] = length
+            self.cache.set(keys[index], length)
+        return counts
+
+    async def count(self, text: str) -> int:
+        return (await self.count_batch([text]))[0]
+
+    async def truncate(self, text: str, max_tokens: int) -> str:
+        """Text cut to at most `max_tokens` tokens"""
+        def cut() -> str:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return self.encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+        return await asyncio.to_thread(cut)
+
+    def stats(self) -> dict:
+        return self.cache.stats()